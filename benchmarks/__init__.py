@@ -0,0 +1,2 @@
+# benchmarks package initializer
+# keep package import side-effect free
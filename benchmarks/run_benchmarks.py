@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmarks on synthetic data.
+
+Generates a synthetic scene (benchmarks/synthetic.py), then times each pipeline stage:
+
+  chipping     preprocess/chip_dataset.chip_rasters on the scene (in-process)
+  dataset      one pass of a DataLoader over ChipDataset
+  train_step   forward + backward + optimizer step of SiameseUNet
+  inference    batched SiameseUNet forward passes
+  evaluation   train/eval_and_register.evaluate over the chips
+  drift        monitor/monitor.compute_profile over the chips
+  predict      concurrent /predict requests against the app (in-process client)
+
+Each benchmark runs --warmup untimed and --repeat timed iterations; the JSON result records
+min/median seconds and throughput. With --compare, results are checked against a stored
+result file and any benchmark whose median is more than --tolerance slower is flagged
+(exit status 1).
+
+Usage:
+python benchmarks/run_benchmarks.py --out bench.json
+python benchmarks/run_benchmarks.py --out bench_new.json --compare bench.json --tolerance 0.15
+"""
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import torch
+from benchmarks.synthetic import generate_scene
+from preprocess.chip_dataset import chip_rasters
+
+BENCHMARKS = ["chipping", "dataset", "train_step", "inference", "evaluation", "drift", "predict"]
+
+def timeit(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+def summarize(times, items, unit):
+    med = statistics.median(times)
+    return {"min_s": min(times), "median_s": med, "items": items, "unit": unit,
+            "throughput": items / med if med > 0 else None}
+
+class Suite:
+    def __init__(self, work_dir, args):
+        self.dir = work_dir
+        self.args = args
+        self.scene = generate_scene(os.path.join(work_dir, "raw"), args.width, args.height, seed=args.seed)
+        self.chips = os.path.join(work_dir, "chips")
+        self._chip(self.chips)
+        self.n_chips = len([f for f in os.listdir(self.chips) if f.endswith("_before.tif")])
+        from train.model.siamese_unet import SiameseUNet
+        torch.manual_seed(args.seed)
+        self.model = SiameseUNet(in_ch=6)
+        self.model_path = os.path.join(work_dir, "model.pth")
+        torch.save(self.model.state_dict(), self.model_path)
+
+    def _chip(self, out_dir):
+        b, a, m = self.scene
+        return chip_rasters(b, a, m, out_dir, self.args.tile_size, self.args.tile_size)
+
+    def _batch(self):
+        g = torch.Generator().manual_seed(self.args.seed)
+        shape = (self.args.batch_size, 6, self.args.tile_size, self.args.tile_size)
+        b = torch.randint(0, 12000, shape, generator=g, dtype=torch.int32).to(torch.uint16)
+        a = torch.randint(0, 12000, shape, generator=g, dtype=torch.int32).to(torch.uint16)
+        m = (torch.rand((shape[0], 1) + shape[2:], generator=g) < 0.05).float()
+        return b, a, m
+
+    def chipping(self):
+        out = os.path.join(self.dir, "chips_bench")
+        return summarize(timeit(lambda: self._chip(out), self.args.repeat, self.args.warmup), self.n_chips, "chips")
+
+    def dataset(self):
+        from torch.utils.data import DataLoader
+        from train.train import ChipDataset
+        dl = DataLoader(ChipDataset(self.chips), batch_size=self.args.batch_size, num_workers=self.args.workers)
+        def run():
+            for _ in dl:
+                pass
+        return summarize(timeit(run, self.args.repeat, self.args.warmup), self.n_chips, "chips")
+
+    def train_step(self):
+        b, a, m = self._batch()
+        model = self.model.train()
+        opt = torch.optim.Adam(model.parameters(), lr=3e-4)
+        bce = torch.nn.BCEWithLogitsLoss()
+        def run():
+            loss = bce(model(b, a), m)
+            opt.zero_grad(); loss.backward(); opt.step()
+        res = summarize(timeit(run, self.args.repeat, self.args.warmup), b.shape[0], "chips")
+        model.load_state_dict(torch.load(self.model_path))
+        return res
+
+    def inference(self):
+        b, a, _ = self._batch()
+        model = self.model.eval()
+        def run():
+            with torch.inference_mode():
+                model(b, a).sigmoid()
+        return summarize(timeit(run, self.args.repeat, self.args.warmup), b.shape[0], "chips")
+
+    def evaluation(self):
+        from train.eval_and_register import evaluate
+        n = min(self.n_chips, 50)  # evaluate() scores at most 50 chips
+        return summarize(timeit(lambda: evaluate(self.model_path, self.chips), self.args.repeat, self.args.warmup),
+                         n, "chips")
+
+    def drift(self):
+        from monitor.monitor import compute_profile
+        n = min(self.n_chips, 200)
+        return summarize(timeit(lambda: compute_profile(self.chips), self.args.repeat, self.args.warmup), n, "chips")
+
+    def predict(self):
+        os.environ["MODEL_PATH"] = self.model_path
+        from fastapi.testclient import TestClient
+        from serve.app.main import app
+        client = TestClient(app)
+        bf = os.path.join(self.chips, "tile_00000_before.tif")
+        af = os.path.join(self.chips, "tile_00000_after.tif")
+        with open(bf, "rb") as f:
+            before = f.read()
+        with open(af, "rb") as f:
+            after = f.read()
+        n = self.args.requests
+        latencies = []  # per-request latencies of the timed runs only
+        def one(_):
+            t0 = time.perf_counter()
+            r = client.post("/predict", files={"before": ("b.tif", before), "after": ("a.tif", after)})
+            r.raise_for_status()
+            path = r.json().get("result_npy")
+            if path and os.path.exists(path):
+                os.remove(path)
+            latencies.append(time.perf_counter() - t0)
+        def run():
+            with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+                list(pool.map(one, range(n)))
+        for _ in range(self.args.warmup):
+            run()
+        latencies.clear()
+        res = summarize(timeit(run, self.args.repeat, 0), n, "requests")
+        latencies.sort()
+        res["latency_p50_s"] = latencies[len(latencies) // 2]
+        res["latency_p95_s"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return res
+
+def environment():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True).stdout.strip() or None
+    except OSError:
+        sha = None
+    return {"python": platform.python_version(), "torch": torch.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "torch_threads": torch.get_num_threads(), "git": sha}
+
+def compare(results, baseline, tolerance):
+    """Return [(name, base_median, new_median, ratio)] for benchmarks slower than tolerance."""
+    regressions = []
+    for name, res in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median_s" not in res:
+            continue
+        ratio = res["median_s"] / base["median_s"]
+        flag = "REGRESSION" if ratio > 1 + tolerance else ("improved" if ratio < 1 - tolerance else "ok")
+        print(f"[CMP] {name:11s} {base['median_s']*1000:9.1f}ms -> {res['median_s']*1000:9.1f}ms  x{ratio:.2f}  {flag}")
+        if flag == "REGRESSION":
+            regressions.append((name, base["median_s"], res["median_s"], ratio))
+    return regressions
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    p.add_argument("--width", type=int, default=1024)
+    p.add_argument("--height", type=int, default=1024)
+    p.add_argument("--tile-size", type=int, default=256)
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--workers", type=int, default=0, help="DataLoader workers for the dataset benchmark")
+    p.add_argument("--requests", type=int, default=16)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--warmup", type=int, default=1)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--threads", type=int, default=None, help="torch.set_num_threads for stable numbers")
+    p.add_argument("--work-dir", default=None, help="Keep generated data here (default: temp dir)")
+    p.add_argument("--compare", default=None, help="Stored result JSON to check for regressions")
+    p.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown of the median (0.15 = 15%%)")
+    args = p.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = args.work_dir or tmp
+        print(f"[INFO] generating {args.width}x{args.height} synthetic scene in {work_dir}")
+        suite = Suite(work_dir, args)
+        results = {"env": environment(), "config": {k: v for k, v in vars(args).items()
+                                                    if k not in ("out", "compare", "work_dir")},
+                   "results": {}}
+        for name in args.only:
+            res = getattr(suite, name)()
+            results["results"][name] = res
+            print(f"[BENCH] {name:11s} median={res['median_s']*1000:9.1f}ms  "
+                  f"{res['throughput']:.2f} {res['unit']}/s")
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print("[OK] results written to", args.out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("width") != args.width or baseline.get("config", {}).get("height") != args.height:
+            print("[WARN] baseline was recorded with a different scene size")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[ERR] {len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("[OK] no regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic before/after/mask rasters for benchmarking.
+
+Writes <out_dir>/<name>_before.tif, <name>_after.tif (6-band uint16 Sentinel-2 DN) and
+<name>_mask.tif (uint8). Band levels follow baseline.json; changed pixels get the spectral
+signature of clearing (NIR drops, visible/SWIR rise). Output is fully determined by --seed.
+
+Usage:
+python benchmarks/synthetic.py --out-dir /tmp/bench --width 2048 --height 2048
+"""
+import argparse, os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# per-band reflectance mean/std (B2, B3, B4, B8, B11, B12), as in baseline.json
+BAND_MEAN = np.array([0.0468, 0.0608, 0.0468, 0.2638, 0.1626, 0.0886])
+BAND_STD = np.array([0.0127, 0.0148, 0.0179, 0.0488, 0.0344, 0.0296])
+# reflectance shift applied to cleared pixels
+CLEARING_DELTA = np.array([0.03, 0.04, 0.06, -0.12, 0.08, 0.07])
+
+def make_mask(rng, height, width, change_frac):
+    mask = np.zeros((height, width), dtype=np.uint8)
+    target = change_frac * height * width
+    while mask.sum() < target:
+        h, w = rng.integers(4, max(5, height // 8)), rng.integers(4, max(5, width // 8))
+        r, c = rng.integers(0, height - h + 1), rng.integers(0, width - w + 1)
+        mask[r:r+h, c:c+w] = 1
+    return mask
+
+def generate_scene(out_dir, width=1024, height=1024, seed=0, change_frac=0.05, name="synthetic", block=256):
+    """Write one scene triplet; returns (before_path, after_path, mask_path)."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    profile = dict(driver="GTiff", width=width, height=height, count=6, dtype="uint16",
+                   crs="EPSG:32643", transform=from_origin(600000, 1300000, 10, 10),
+                   compress="lzw", tiled=True, blockxsize=block, blockysize=block)
+    mask = make_mask(rng, height, width, change_frac)
+    paths = [os.path.join(out_dir, f"{name}_{k}.tif") for k in ("before", "after", "mask")]
+    before = np.empty((6, height, width), dtype=np.uint16)
+    for i in range(6):
+        refl = rng.normal(BAND_MEAN[i], BAND_STD[i], (height, width))
+        before[i] = np.clip(refl * 10000, 0, 65535)
+    after = before.astype(np.int32)
+    noise = rng.normal(0, 0.005, after.shape) * 10000
+    after += noise.astype(np.int32)
+    after += (CLEARING_DELTA[:, None, None] * 10000 * mask[None]).astype(np.int32)
+    after = np.clip(after, 0, 65535).astype(np.uint16)
+    with rasterio.open(paths[0], "w", **profile) as dst:
+        dst.write(before)
+    with rasterio.open(paths[1], "w", **profile) as dst:
+        dst.write(after)
+    profile.update(count=1, dtype="uint8")
+    with rasterio.open(paths[2], "w", **profile) as dst:
+        dst.write(mask, 1)
+    return tuple(paths)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--out-dir", required=True)
+    p.add_argument("--width", type=int, default=1024)
+    p.add_argument("--height", type=int, default=1024)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--change-frac", type=float, default=0.05)
+    p.add_argument("--name", default="synthetic")
+    args = p.parse_args()
+    paths = generate_scene(args.out_dir, args.width, args.height, args.seed, args.change_frac, args.name)
+    print("[OK] wrote", ", ".join(paths))
+
+if __name__ == "__main__":
+    main()
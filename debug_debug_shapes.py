@@ -11,15 +11,10 @@ afile = bfile.replace('_before.tif','_after.tif')
 mfile = bfile.replace('_before.tif','_mask.tif')
 print("Using files:", bfile, afile, mfile)
 
-# load with rasterio (lazy import inside)
-import rasterio, numpy as np
-def read_tif(p):
-    with rasterio.open(p) as ds:
-        arr = ds.read().astype('float32')/10000.0
-    return arr
-
-b_arr = read_tif(bfile)
-a_arr = read_tif(afile)
+# raw uint16 DN; the model scales reflectance itself
+from train.raster_io import read_raw
+b_arr = read_raw(bfile)
+a_arr = read_raw(afile)
 # add batch dim and convert to torch
 b = torch.from_numpy(b_arr).unsqueeze(0)    # (1,C,H,W)
 a = torch.from_numpy(a_arr).unsqueeze(0)
@@ -63,21 +58,23 @@ print("bottleneck output", tuple(bt.shape))
 
 # step through decoder, printing shapes before each concat
 x = bt
-print("\\n=== Decoder steps ===")
-for i, (up, skip) in enumerate([(model.up4, c3), (model.up3, c2), (model.up2, c1), (model.up1, c1)]):
-    print(f\"Before up{i+1}: x={tuple(x.shape)} skip={tuple(skip.shape)}\")
+print("\n=== Decoder steps ===")
+for name, skip in [("up3", c3), ("up2", c2), ("up1", c1)]:
+    up = getattr(model, name)
+    print(f"Before {name}: x={tuple(x.shape)} skip={tuple(skip.shape)}")
     # up module will attempt to upsample and concat, so call its up only to inspect sizes
     x_up = up.up(x)
-    print(f\"After convtranspose: x_up={tuple(x_up.shape)} (will concat with skip)\")
+    print(f"After convtranspose: x_up={tuple(x_up.shape)} (will concat with skip)")
     # if spatial mismatch, report it
     if x_up.shape[2:] != skip.shape[2:]:
-        print(f\"SPATIAL MISMATCH at up{i+1}: x_up.shape={x_up.shape}, skip.shape={skip.shape}\")
+        print(f"SPATIAL MISMATCH at {name}: x_up.shape={x_up.shape}, skip.shape={skip.shape}")
     # perform actual forward for progress
     try:
         x = up(x, skip)
     except Exception as e:
-        print(f\"ERROR during up{i+1} forward: {e}\") 
+        print(f"ERROR during {name} forward: {e}")
         raise
-    print(f\"After up{i+1} conv output: x={tuple(x.shape)}\\n\")
+    print(f"After {name} conv output: x={tuple(x.shape)}\n")
 
+x = model.final(x)
 print("PASS: decoder completed, final shape:", tuple(x.shape))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+export_scheduler.py - plan and run many Earth Engine export tasks.
+
+Pure Python (no earthengine-api import) so it can be exercised offline. The scheduler talks to
+an export client with two methods:
+
+  submit(job) -> task_id        start one export task for a job dict
+  status(task_ids) -> {id: {"state": ..., "error_message": ...}}
+
+gee_ingest.EarthEngineClient is the real implementation; any stub with the same methods works.
+
+Jobs are plain dicts (see plan_jobs). Completed, failed and in-flight jobs (with their task ids)
+are recorded in a JSON manifest that is rewritten after every state change. Re-running with the
+same manifest skips completed jobs and resumes polling in-flight tasks instead of resubmitting.
+
+Failed submissions are retried with exponential backoff; quota/rate errors also pause all new
+submissions for the backoff delay. Tasks whose state stays unknown (or missing from status
+responses) for longer than unknown_timeout are treated as failed.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from shapely.geometry import shape, box, mapping
+
+TERMINAL_OK = {"COMPLETED", "SUCCEEDED"}
+TERMINAL_FAIL = {"FAILED", "CANCELLED", "CANCEL_REQUESTED"}
+QUOTA_ERROR = re.compile(r"quota|too many|rate limit|resource.?exhausted|429", re.IGNORECASE)
+
+def load_features(path):
+    with open(path, "r") as f:
+        gj = json.load(f)
+    # support FeatureCollection or single Feature
+    return [feat["geometry"] for feat in gj.get("features", [gj]) if feat.get("geometry")]
+
+def grid_tiles(geometry, tile_deg):
+    """Split a GeoJSON geometry into grid cells of tile_deg (in the geometry's CRS units).
+
+    Returns [(row, col, region_geojson)] for cells that intersect the geometry. Each region is
+    the cell clipped to the geometry's bounding box, which keeps export regions rectangular.
+    """
+    geom = shape(geometry)
+    minx, miny, maxx, maxy = geom.bounds
+    if not tile_deg or (maxx - minx <= tile_deg and maxy - miny <= tile_deg):
+        return [(0, 0, mapping(box(minx, miny, maxx, maxy)))]
+    ncols = max(1, math.ceil((maxx - minx) / tile_deg))
+    nrows = max(1, math.ceil((maxy - miny) / tile_deg))
+    tiles = []
+    for r in range(nrows):
+        for c in range(ncols):
+            cell = box(minx + c*tile_deg, max(miny, maxy - (r+1)*tile_deg),
+                       min(maxx, minx + (c+1)*tile_deg), maxy - r*tile_deg)
+            # cells that only touch the geometry's boundary have nothing to export
+            if cell.intersection(geom).area > 0:
+                tiles.append((r, c, mapping(cell)))
+    return tiles
+
+def plan_jobs(aoi_paths, periods, tile_deg=None, name=None, dest=None):
+    """Build one export job per (AOI, feature, grid tile, period).
+
+    periods: [(label, start, end)], e.g. [("before", "2024-01-01", "2024-01-31"), ...]
+    dest: {"type": "drive", "folder": ...} or {"type": "gcs", "bucket": ..., "prefix": ...}
+
+    Names follow the original scheme <aoi>_<label>_<start>_<end>; _fNNN and _rNNcNN are
+    inserted only when an AOI has several features or a feature is split into several tiles.
+    """
+    if name and len(aoi_paths) > 1:
+        raise ValueError("--name can only be used with a single AOI")
+    jobs = []
+    for aoi_path in aoi_paths:
+        aoi_name = name or os.path.splitext(os.path.basename(aoi_path))[0]
+        features = load_features(aoi_path)
+        for fi, feature in enumerate(features):
+            tiles = grid_tiles(feature, tile_deg)
+            for row, col, region in tiles:
+                stem = aoi_name
+                if len(features) > 1:
+                    stem += f"_f{fi:03d}"
+                if len(tiles) > 1:
+                    stem += f"_r{row:02d}c{col:02d}"
+                for label, start, end in periods:
+                    job = {
+                        "name": f"{stem}_{label}_{start}_{end}",
+                        "aoi": aoi_name, "aoi_path": aoi_path, "feature": fi, "tile": [row, col],
+                        "period": label, "start": start, "end": end,
+                        "feature_geometry": feature, "region": region,
+                    }
+                    if dest:
+                        job["dest"] = dict(dest)
+                        if dest["type"] == "gcs" and len(aoi_paths) > 1:
+                            job["dest"]["prefix"] = f"{dest['prefix']}/{aoi_name}"
+                    jobs.append(job)
+    return jobs
+
+def output_uri(job):
+    dest = job.get("dest") or {}
+    if dest.get("type") == "gcs":
+        return f"gs://{dest['bucket']}/{dest['prefix']}/{job['name']}.tif"
+    if dest.get("type") == "drive":
+        return f"drive://{dest['folder']}/{job['name']}.tif"
+    return job["name"]
+
+def load_manifest(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest.setdefault("active", {})
+        return manifest
+    return {"completed": {}, "failed": {}, "active": {}}
+
+def write_manifest(path, manifest):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+def _record(job, **extra):
+    rec = {k: v for k, v in job.items() if k not in ("feature_geometry", "region")}
+    rec["output"] = output_uri(job)
+    rec.update(extra)
+    return rec
+
+async def run_exports(client, jobs, max_concurrent=10, poll_interval=30.0, max_retries=2,
+                      manifest_path=None, backoff=5.0, unknown_timeout=600.0, log=print):
+    """Submit jobs with at most max_concurrent tasks in flight, poll until all finish.
+
+    Returns the manifest dict ({"completed": {name: record}, "failed": {...}, "active": {...}}).
+    """
+    manifest = load_manifest(manifest_path)
+    manifest["failed"] = {}
+    by_name = {j["name"]: j for j in jobs}
+    active = {}     # task_id -> job
+    last_seen = {}  # task_id -> monotonic time of the last known, non-terminal state
+    now = time.monotonic()
+    for task_id, rec in list(manifest["active"].items()):
+        job = by_name.get(rec["name"])
+        if job is None or rec["name"] in manifest["completed"]:
+            log(f"[WARN] dropping in-flight task {task_id} ({rec['name']}): not part of this run")
+            del manifest["active"][task_id]
+            continue
+        active[task_id] = job
+        last_seen[task_id] = now
+    if active:
+        log(f"[INFO] resuming {len(active)} in-flight tasks from manifest")
+    in_flight = {j["name"] for j in active.values()}
+    queue = [j for j in jobs if j["name"] not in manifest["completed"] and j["name"] not in in_flight]
+    skipped = len(jobs) - len(queue) - len(in_flight)
+    if skipped:
+        log(f"[INFO] {skipped} jobs already completed in manifest; skipping")
+    attempts = {}
+    ready_at = {}        # job name -> monotonic time before which it must not be resubmitted
+    pause_until = 0.0    # no submissions at all before this (after quota errors)
+    t0 = time.monotonic()
+
+    async def submit(job):
+        attempts[job["name"]] = attempts.get(job["name"], 0) + 1
+        try:
+            task_id = await asyncio.to_thread(client.submit, job)
+        except Exception as e:
+            return job, None, str(e)
+        return job, task_id, None
+
+    def fail_or_retry(job, error):
+        nonlocal pause_until
+        n = attempts.get(job["name"], 1)
+        if n <= max_retries:
+            delay = backoff * (2 ** (n - 1)) * (1 + random.random())
+            ready_at[job["name"]] = time.monotonic() + delay
+            if QUOTA_ERROR.search(error):
+                pause_until = max(pause_until, ready_at[job["name"]])
+                log(f"[WARN] quota error; pausing submissions for {delay:.0f}s")
+            log(f"[WARN] {job['name']}: {error}; retrying in {delay:.0f}s (attempt {n})")
+            queue.append(job)
+        else:
+            log(f"[ERR] {job['name']}: {error}")
+            manifest["failed"][job["name"]] = _record(job, error=error, attempts=n)
+
+    def finish(task_id):
+        last_seen.pop(task_id, None)
+        manifest["active"].pop(task_id, None)
+        return active.pop(task_id)
+
+    while queue or active:
+        now = time.monotonic()
+        free = max_concurrent - len(active)
+        if free > 0 and queue and now >= pause_until:
+            batch = [j for j in queue if ready_at.get(j["name"], 0.0) <= now][:free]
+            for j in batch:
+                queue.remove(j)
+            if batch:
+                for job, task_id, error in await asyncio.gather(*(submit(j) for j in batch)):
+                    if task_id is None:
+                        fail_or_retry(job, error)
+                    else:
+                        log(f"[INFO] EARTH ENGINE TASK: {task_id} ({job['name']})")
+                        active[task_id] = job
+                        last_seen[task_id] = time.monotonic()
+                        manifest["active"][task_id] = _record(job, task_id=task_id, submitted=time.time())
+                write_manifest(manifest_path, manifest)
+        if not active:
+            if queue:
+                # everything left is backing off: sleep until the first job may be resubmitted
+                wake = max(pause_until, min(ready_at.get(j["name"], 0.0) for j in queue))
+                await asyncio.sleep(max(0.0, wake - time.monotonic()))
+            continue
+        await asyncio.sleep(poll_interval)
+        try:
+            statuses = await asyncio.to_thread(client.status, list(active))
+        except Exception as e:
+            # transient API error: the tasks keep running server-side, so poll again next interval
+            log(f"[WARN] status poll failed: {e}")
+            statuses = {}
+        now = time.monotonic()
+        changed = False
+        for task_id in list(active):
+            state = (statuses.get(task_id) or {}).get("state")
+            if state in TERMINAL_OK:
+                job = finish(task_id)
+                manifest["completed"][job["name"]] = _record(job, task_id=task_id, finished=time.time())
+                log(f"[OK] {job['name']} -> {output_uri(job)}")
+            elif state in TERMINAL_FAIL:
+                fail_or_retry(finish(task_id), f"{state}: {statuses[task_id].get('error_message', '')}")
+            elif state is None or state == "UNKNOWN":
+                if now - last_seen[task_id] <= unknown_timeout:
+                    continue
+                fail_or_retry(finish(task_id), f"task {task_id} state unknown for {unknown_timeout:.0f}s")
+            else:
+                last_seen[task_id] = now
+                continue
+            changed = True
+        if changed:
+            write_manifest(manifest_path, manifest)
+        log(f"[INFO] active={len(active)} queued={len(queue)} done={len(manifest['completed'])} "
+            f"failed={len(manifest['failed'])} elapsed={time.monotonic()-t0:.0f}s")
+    write_manifest(manifest_path, manifest)
+    return manifest
@@ -12,12 +12,22 @@ python ingest/gee_ingest.py \
   --drive-folder EO_Exports \
   --cloud-pct 60 --scale 10 --crs EPSG:4326
 
+Several AOIs may be passed to --aoi. Every feature of each FeatureCollection is exported,
+features larger than --tile-deg are split into a grid of export tiles, and tasks are run through
+export_scheduler with at most --max-concurrent in flight. The script waits for all tasks and
+writes a manifest of completed outputs (--manifest); re-running skips completed exports.
+
 Requires earthengine-api installed and authenticated.
 """
 import argparse
-import json
-import ee
+import asyncio
+import os
 import sys
+import threading
+import ee
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from export_scheduler import plan_jobs, run_exports
 
 def init_ee(project, service_account=None, key_file=None):
     if service_account and key_file:
@@ -26,14 +36,6 @@ def init_ee(project, service_account=None, key_file=None):
     else:
         ee.Initialize(project=project)
 
-def load_aoi(path):
-    with open(path, "r") as f:
-        gj = json.load(f)
-    # support FeatureCollection or single Feature
-    feat = gj.get("features", [gj])[0]
-    geom = ee.Geometry(feat["geometry"])
-    return geom
-
 def sentinel_composite(aoi, start, end, cloud_pct):
     col = (
         ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
@@ -62,7 +64,6 @@ def export_to_drive(img, region, name, folder, scale, crs):
         maxPixels=1e13
     )
     task.start()
-    print("[INFO] EARTH ENGINE TASK:", task.id)
     return task.id
 
 def export_to_gcs(img, region, name, bucket, prefix, scale, crs):
@@ -78,52 +79,91 @@ def export_to_gcs(img, region, name, bucket, prefix, scale, crs):
         maxPixels=1e13
     )
     task.start()
-    print("[INFO] EARTH ENGINE TASK:", task.id)
     return task.id
 
+class EarthEngineClient:
+    """Export client used by export_scheduler.run_exports.
+
+    Composites are built once per (AOI, feature, period) and reused for every grid tile.
+    """
+    def __init__(self, cloud_pct, scale, crs):
+        self.cloud_pct = cloud_pct
+        self.scale = scale
+        self.crs = crs
+        self._composites = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()  # guards _key_locks only
+
+    def composite(self, job):
+        key = (job["aoi_path"], job["feature"], job["start"], job["end"])
+        # submit() runs on worker threads; building a composite makes a blocking getInfo() round
+        # trip, so lock per key: different composites build concurrently, the same one once
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._composites:
+                aoi = ee.Geometry(job["feature_geometry"])
+                self._composites[key] = sentinel_composite(aoi, job["start"], job["end"], self.cloud_pct)
+            return self._composites[key]
+
+    def submit(self, job):
+        img = self.composite(job)
+        region = ee.Geometry(job["region"])
+        dest = job["dest"]
+        if dest["type"] == "drive":
+            return export_to_drive(img, region, job["name"], dest["folder"], self.scale, self.crs)
+        return export_to_gcs(img, region, job["name"], dest["bucket"], dest["prefix"], self.scale, self.crs)
+
+    def status(self, task_ids):
+        return {st["id"]: st for st in ee.data.getTaskStatus(task_ids)}
+
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--project", required=True)
     p.add_argument("--service-account", default=None)
     p.add_argument("--key-file", default=None)
-    p.add_argument("--aoi", required=True)
+    p.add_argument("--aoi", nargs="+", required=True, help="One or more AOI GeoJSON files")
     p.add_argument("--before", nargs=2, required=True)
     p.add_argument("--after", nargs=2, required=True)
-    p.add_argument("--name", required=True)
+    p.add_argument("--name", default=None, help="Output name prefix (single AOI only; default: AOI file name)")
     p.add_argument("--drive-folder", default=None)
     p.add_argument("--gcs-bucket", default=None)
     p.add_argument("--gcs-prefix", default="exports")
     p.add_argument("--scale", type=int, default=10)
     p.add_argument("--crs", default="EPSG:4326")
     p.add_argument("--cloud-pct", type=int, default=60)
+    p.add_argument("--tile-deg", type=float, default=0.25, help="Grid tile size in degrees; 0 disables tiling")
+    p.add_argument("--max-concurrent", type=int, default=10, help="Max export tasks in flight")
+    p.add_argument("--poll-interval", type=float, default=30.0)
+    p.add_argument("--max-retries", type=int, default=2)
+    p.add_argument("--submit-backoff", type=float, default=5.0, help="Base retry delay in seconds (doubles per attempt)")
+    p.add_argument("--unknown-timeout", type=float, default=600.0, help="Fail tasks whose state stays unknown this long")
+    p.add_argument("--manifest", default="ingest_manifest.json")
     return p.parse_args()
 
 def main():
     args = parse_args()
-    init_ee(args.project, args.service_account, args.key_file)
-    print("[INFO] Loading AOI:", args.aoi)
-    aoi = load_aoi(args.aoi)
-    before_start, before_end = args.before
-    after_start, after_end = args.after
-
-    print("[INFO] Building BEFORE composite:", before_start, before_end)
-    before_img = sentinel_composite(aoi, before_start, before_end, args.cloud_pct)
-    print("[INFO] Building AFTER composite:", after_start, after_end)
-    after_img = sentinel_composite(aoi, after_start, after_end, args.cloud_pct)
-
-    fname_before = f"{args.name}_before_{before_start}_{before_end}"
-    fname_after  = f"{args.name}_after_{after_start}_{after_end}"
-
     if args.drive_folder:
-        export_to_drive(before_img, aoi, fname_before, args.drive_folder, args.scale, args.crs)
-        export_to_drive(after_img,  aoi, fname_after,  args.drive_folder, args.scale, args.crs)
+        dest = {"type": "drive", "folder": args.drive_folder}
     elif args.gcs_bucket:
-        export_to_gcs(before_img, aoi, fname_before, args.gcs_bucket, args.gcs_prefix, args.scale, args.crs)
-        export_to_gcs(after_img,  aoi, fname_after,  args.gcs_bucket, args.gcs_prefix, args.scale, args.crs)
+        dest = {"type": "gcs", "bucket": args.gcs_bucket, "prefix": args.gcs_prefix}
     else:
         print("[ERR] Specify --drive-folder or --gcs-bucket", file=sys.stderr)
         sys.exit(2)
-    print("[DONE] Submitted BEFORE and AFTER tasks.")
+    init_ee(args.project, args.service_account, args.key_file)
+    periods = [("before", *args.before), ("after", *args.after)]
+    print("[INFO] Loading AOIs:", " ".join(args.aoi))
+    jobs = plan_jobs(args.aoi, periods, tile_deg=args.tile_deg, name=args.name, dest=dest)
+    print(f"[INFO] Planned {len(jobs)} export tasks")
+
+    client = EarthEngineClient(args.cloud_pct, args.scale, args.crs)
+    manifest = asyncio.run(run_exports(client, jobs, max_concurrent=args.max_concurrent,
+                                       poll_interval=args.poll_interval, max_retries=args.max_retries,
+                                       manifest_path=args.manifest, backoff=args.submit_backoff,
+                                       unknown_timeout=args.unknown_timeout))
+    print(f"[DONE] {len(manifest['completed'])} exports completed, {len(manifest['failed'])} failed; manifest: {args.manifest}")
+    if manifest["failed"]:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -16,6 +16,9 @@ CLOUD_PCT=60
 SCALE=10
 CRS="EPSG:4326"
 AOI_GLOB='aoi/india_*.geojson'
+TILE_DEG=0.25
+MAX_CONCURRENT=10
+MANIFEST="ingest_manifest.json"
 DRY_RUN=false
 
 usage() {
@@ -37,6 +40,9 @@ while [[ $# -gt 0 ]]; do
     --scale) SCALE="$2"; shift 2 ;;
     --crs) CRS="$2"; shift 2 ;;
     --aoi-glob) AOI_GLOB="$2"; shift 2 ;;
+    --tile-deg) TILE_DEG="$2"; shift 2 ;;
+    --max-concurrent) MAX_CONCURRENT="$2"; shift 2 ;;
+    --manifest) MANIFEST="$2"; shift 2 ;;
     --dry-run) DRY_RUN=true; shift 1 ;;
     -h|--help) usage; exit 0 ;;
     *) echo "Unknown arg: $1"; usage; exit 1 ;;
@@ -52,7 +58,8 @@ if [[ -n "$SERVICE_ACCOUNT" && -z "$KEY_FILE" ]]; then echo "[ERR] --key-file re
 
 RUN_PY="python3 ingest/gee_ingest.py"
 
-COMMON=( --project "$PROJECT" --cloud-pct "$CLOUD_PCT" --scale "$SCALE" --crs "$CRS" )
+COMMON=( --project "$PROJECT" --cloud-pct "$CLOUD_PCT" --scale "$SCALE" --crs "$CRS"
+         --tile-deg "$TILE_DEG" --max-concurrent "$MAX_CONCURRENT" --manifest "$MANIFEST" )
 if [[ -n "$SERVICE_ACCOUNT" ]]; then
   COMMON+=( --service-account "$SERVICE_ACCOUNT" --key-file "$KEY_FILE" )
 fi
@@ -62,24 +69,19 @@ AOIS=( $AOI_GLOB )
 if [[ ${#AOIS[@]} -eq 0 ]]; then echo "[WARN] No AOIs found with $AOI_GLOB"; exit 0; fi
 echo "[INFO] Found ${#AOIS[@]} AOIs."
 
-i=0
-for AOI in "${AOIS[@]}"; do
-  ((i++))
-  NAME="$(basename "$AOI" .geojson)"
-  CMD=( $RUN_PY "${COMMON[@]}" --aoi "$AOI" --before "$BEFORE_START" "$BEFORE_END" --after "$AFTER_START" "$AFTER_END" --name "$NAME" )
-  if [[ "$DEST" == "drive" ]]; then
-    CMD+=( --drive-folder "$DRIVE_FOLDER" )
-  else
-    CMD+=( --gcs-bucket "$GCS_BUCKET" --gcs-prefix "$GCS_PREFIX/$NAME" )
-  fi
-  echo "[$i/${#AOIS[@]}] ${CMD[*]}"
-  if $DRY_RUN; then
-    continue
-  fi
-  LOG="logs/${NAME}_$(date +%Y%m%d_%H%M%S).log"
-  mkdir -p logs
-  "${CMD[@]}" 2>&1 | tee "$LOG"
-  echo "[INFO] Completed $NAME (log: $LOG)"
-done
+# all AOIs go through one orchestrated run so exports share the concurrency limit
+CMD=( $RUN_PY "${COMMON[@]}" --aoi "${AOIS[@]}" --before "$BEFORE_START" "$BEFORE_END" --after "$AFTER_START" "$AFTER_END" )
+if [[ "$DEST" == "drive" ]]; then
+  CMD+=( --drive-folder "$DRIVE_FOLDER" )
+else
+  CMD+=( --gcs-bucket "$GCS_BUCKET" --gcs-prefix "${GCS_PREFIX:-exports}" )
+fi
+echo "${CMD[*]}"
+if $DRY_RUN; then
+  exit 0
+fi
+LOG="logs/india_deforestation_$(date +%Y%m%d_%H%M%S).log"
+mkdir -p logs
+"${CMD[@]}" 2>&1 | tee "$LOG"
 
-echo "[DONE] All AOIs processed."
+echo "[DONE] All AOIs processed (log: $LOG, manifest: $MANIFEST)."
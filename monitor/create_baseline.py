@@ -2,9 +2,11 @@
 """
 Compute baseline stats (per-band mean/std and simple histograms) over a sample of chips.
 """
-import argparse, glob, json
+import argparse, glob, json, os, sys
 import numpy as np
-import rasterio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train.raster_io import BufferPool, band_stats
 
 p = argparse.ArgumentParser()
 p.add_argument("--chips-dir", required=True)
@@ -18,11 +20,11 @@ if len(files) == 0:
 files = files[:args.sample]
 means = []
 stds = []
+buffers = BufferPool()
 for f in files:
-    with rasterio.open(f) as ds:
-        arr = ds.read().astype('float32')/10000.0
-        means.append(arr.reshape(arr.shape[0], -1).mean(axis=1).tolist())
-        stds.append(arr.reshape(arr.shape[0], -1).std(axis=1).tolist())
+    mean, std = band_stats(buffers.read_raw(f))
+    means.append(mean.tolist())
+    stds.append(std.tolist())
 
 means = np.array(means)
 stds = np.array(stds)
@@ -11,10 +11,12 @@ import glob
 import os
 import sys
 import numpy as np
-import rasterio
 from scipy.stats import ks_2samp
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train.raster_io import BufferPool, band_stats
+
 def load_baseline(path):
     with open(path, "r") as f:
         return json.load(f)
@@ -26,13 +28,13 @@ def compute_profile(chips_dir, sample_size=200):
     
     files = files[:sample_size]
     means = []
+    buffers = BufferPool()
     
     print(f"[INFO] Profiling {len(files)} new chips...")
     for f in files:
-        with rasterio.open(f) as ds:
-            arr = ds.read().astype('float32') / 10000.0
-            # Mean of each band for this chip
-            means.append(arr.reshape(arr.shape[0], -1).mean(axis=1).tolist())
+        # Mean of each band for this chip
+        mean, _ = band_stats(buffers.read_raw(f))
+        means.append(mean.tolist())
             
     means = np.array(means)
     # Return the distribution of means for the first band (as a simple proxy)
@@ -0,0 +1,2 @@
+# preprocess package initializer
+# keep package import side-effect free
@@ -6,43 +6,60 @@ Produces files:
   out_dir/tile_00000_before.tif
   out_dir/tile_00000_after.tif
   out_dir/tile_00000_mask.tif
+
+Image chips are written as uint16 digital numbers, mask chips as uint8.
 """
-import argparse, os
+import argparse, os, sys
 import rasterio
 from rasterio.windows import Window
 
-p = argparse.ArgumentParser()
-p.add_argument("--before", required=True)
-p.add_argument("--after", required=True)
-p.add_argument("--mask", required=True)
-p.add_argument("--tile-size", type=int, default=256)
-p.add_argument("--stride", type=int, default=256)
-p.add_argument("--out-dir", required=True)
-args = p.parse_args()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train.raster_io import BufferPool, RAW_DTYPE
 
-os.makedirs(args.out_dir, exist_ok=True)
+def chip_rasters(before, after, mask, out_dir, tile_size=256, stride=256):
+    """Write tile_NNNNN_{before,after,mask}.tif chips to out_dir; returns the number of tiles."""
+    os.makedirs(out_dir, exist_ok=True)
+    with rasterio.open(before) as bsrc, rasterio.open(after) as asrc, rasterio.open(mask) as msrc:
+        assert bsrc.crs == asrc.crs == msrc.crs, "CRS mismatch"
+        assert bsrc.width == asrc.width == msrc.width, "Width mismatch"
+        assert bsrc.height == asrc.height == msrc.height, "Height mismatch"
 
-with rasterio.open(args.before) as bsrc, rasterio.open(args.after) as asrc, rasterio.open(args.mask) as msrc:
-    assert bsrc.crs == asrc.crs == msrc.crs, "CRS mismatch"
-    assert bsrc.width == asrc.width == msrc.width, "Width mismatch"
-    assert bsrc.height == asrc.height == msrc.height, "Height mismatch"
+        buffers = BufferPool()
+        meta = bsrc.profile.copy()
+        meta.pop("transform", None)
+        meta.update(width=tile_size, height=tile_size, dtype=RAW_DTYPE.__name__)
+        if meta.get("nodata") is not None and not float(meta["nodata"]).is_integer():
+            meta["nodata"] = None  # e.g. NaN on float exports; not representable in uint16
+        meta_mask = meta.copy(); meta_mask.update(count=1, dtype='uint8')
+        n=0
+        for yi in range(0, bsrc.height - tile_size + 1, stride):
+            for xi in range(0, bsrc.width - tile_size + 1, stride):
+                win = Window(xi, yi, tile_size, tile_size)
+                b = buffers.read_raw(bsrc, name="before", window=win)
+                a = buffers.read_raw(asrc, name="after", window=win)
+                m = buffers.read_mask(msrc, window=win)
+                base = os.path.join(out_dir, f"tile_{n:05d}")
+                transform = bsrc.window_transform(win)
+                with rasterio.open(base + "_before.tif", "w", transform=transform, **meta) as dst:
+                    dst.write(b)
+                with rasterio.open(base + "_after.tif", "w", transform=transform, **meta) as dst:
+                    dst.write(a)
+                with rasterio.open(base + "_mask.tif", "w", transform=transform, **meta_mask) as dst:
+                    dst.write(m, 1)
+                n += 1
+    return n
 
-    n=0
-    for yi in range(0, bsrc.height - args.tile_size + 1, args.stride):
-        for xi in range(0, bsrc.width - args.tile_size + 1, args.stride):
-            win = Window(xi, yi, args.tile_size, args.tile_size)
-            before = bsrc.read(window=win)
-            after  = asrc.read(window=win)
-            mask   = msrc.read(1, window=win)
-            base = os.path.join(args.out_dir, f"tile_{n:05d}")
-            meta = bsrc.profile.copy()
-            meta.update(width=args.tile_size, height=args.tile_size, transform=bsrc.window_transform(win))
-            with rasterio.open(base + "_before.tif", "w", **meta) as dst:
-                dst.write(before)
-            with rasterio.open(base + "_after.tif", "w", **meta) as dst:
-                dst.write(after)
-            meta_mask = meta.copy(); meta_mask.update(count=1, dtype='uint8')
-            with rasterio.open(base + "_mask.tif", "w", **meta_mask) as dst:
-                dst.write(mask.astype('uint8'), 1)
-            n += 1
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--before", required=True)
+    p.add_argument("--after", required=True)
+    p.add_argument("--mask", required=True)
+    p.add_argument("--tile-size", type=int, default=256)
+    p.add_argument("--stride", type=int, default=256)
+    p.add_argument("--out-dir", required=True)
+    args = p.parse_args()
+    n = chip_rasters(args.before, args.after, args.mask, args.out_dir, args.tile_size, args.stride)
     print("[OK] wrote", n, "tiles to", args.out_dir)
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,28 @@
 """
 Simple FastAPI server that accepts two uploaded GeoTIFFs (before/after) and returns a prediction mask (.npy)
 This is a minimal working server to verify end-to-end functionality.
+
+With ?format=geojson or ?format=ndjson the thresholded mask is instead vectorized into change
+polygons (WGS84) and streamed back, which is far smaller than the probability array. A failure
+after streaming has started cannot change the 200 status, so the body ends with an error record
+instead: a {"type": "Error"} line (ndjson) or an "error" member on the FeatureCollection.
 """
 from fastapi import FastAPI, File, UploadFile, HTTPException
-import uvicorn, tempfile, os, numpy as np, rasterio, torch
-from train.model.siamese_unet import SiameseUNet
+from fastapi.responses import StreamingResponse
+import itertools, uvicorn, tempfile, os, numpy as np, rasterio, torch
+from train.model.siamese_unet import SiameseUNet, load_siamese_unet
+from train.raster_io import read_raw
+from serve.vectorize import polygonize, iter_geojson, iter_ndjson
 
 app = FastAPI(title="Geospatial Change Detection API")
 
 MODEL_PATH = os.environ.get("MODEL_PATH", "runs/model_inference.pth")
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = SiameseUNet(in_ch=6).to(DEVICE)
+# checkpoint width is read from the weights, so distilled students serve the same way
 if os.path.exists(MODEL_PATH):
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
+    model = load_siamese_unet(MODEL_PATH, DEVICE)
+else:
+    model = SiameseUNet(in_ch=6).to(DEVICE)
 model.eval()
 
 @app.get("/health")
@@ -27,21 +37,36 @@ def read_tiff_bytes(data: bytes):
     return tmp.name
 
 @app.post("/predict")
-async def predict(before: UploadFile = File(...), after: UploadFile = File(...)):
+async def predict(before: UploadFile = File(...), after: UploadFile = File(...),
+                  format: str = "npy", threshold: float = 0.5, min_area_px: int = 4, simplify_px: float = 1.0):
+    if format not in ("npy", "geojson", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be npy, geojson or ndjson")
     before_bytes = await before.read()
     after_bytes = await after.read()
     bpath = read_tiff_bytes(before_bytes)
     apath = read_tiff_bytes(after_bytes)
     try:
         with rasterio.open(bpath) as ds:
-            b = ds.read().astype('float32')/10000.0
-        with rasterio.open(apath) as ds:
-            a = ds.read().astype('float32')/10000.0
+            transform, crs = ds.transform, ds.crs
+            b = read_raw(ds)
+        a = read_raw(apath)
         tb = torch.from_numpy(b).unsqueeze(0).to(DEVICE)
         ta = torch.from_numpy(a).unsqueeze(0).to(DEVICE)
         with torch.no_grad():
             out = model(tb, ta)
             prob = out.sigmoid().squeeze(0).cpu().numpy()
+        if format != "npy":
+            features = polygonize(prob[0], transform, crs, threshold=threshold,
+                                  min_area_px=min_area_px, simplify_px=simplify_px)
+            # polygonize is lazy: build the first feature here so setup errors still return a 500
+            first = next(features, None)
+            if first is not None:
+                features = itertools.chain([first], features)
+            else:
+                features = iter(())
+            if format == "ndjson":
+                return StreamingResponse(iter_ndjson(features, error_record=True), media_type="application/x-ndjson")
+            return StreamingResponse(iter_geojson(features, error_record=True), media_type="application/geo+json")
         # return a small npy as proof-of-concept (client can save & view)
         outfile = tempfile.NamedTemporaryFile(delete=False, suffix=".npy")
         np.save(outfile, prob)
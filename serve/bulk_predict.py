@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Offline bulk change detection over directories of before/after scenes.
+
+Pairs <key>_before*.tif with <key>_after*.tif in each --scenes-dir and writes
+<out-dir>/<key>_pred.tif (float32 change probability, tiled, DEFLATE, georeferenced like the
+before scene) and/or <key>_changes.ndjson (change polygons, see serve/vectorize.py). Three stages are pipelined through bounded queues so memory stays flat:
+
+  reader threads   windowed uint16 reads of before/after (one scene at a time per thread)
+  main thread      batched SiameseUNet forward passes
+  writer threads   windowed GeoTIFF writes (each scene is owned by one writer)
+
+Outputs are written to <name>.part.<ext> and renamed when the last window lands, so an
+interrupted run resumes by skipping scenes whose final output exists. Per-stage utilization is
+printed at the end: the stage closest to 100% is the bottleneck.
+
+Usage:
+python serve/bulk_predict.py --scenes-dir data/raw --out-dir data/predictions --model-path runs/model_inference.pth
+"""
+import argparse, glob, json, os, queue, sys, threading, time
+import numpy as np
+import rasterio
+import torch
+from rasterio.windows import Window
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train.model.siamese_unet import load_siamese_unet
+from train.raster_io import read_raw
+from serve.vectorize import ChangeVectorizer, iter_ndjson
+
+# encoder downsamples 3x; window sizes must be divisible by this
+SIZE_MULTIPLE = 8
+_DONE = object()
+
+OUTPUT_SUFFIX = {"raster": "_pred.tif", "polygons": "_changes.ndjson"}
+
+def find_scenes(scenes_dirs, out_dir, outputs=("raster",)):
+    """Return [(key, before_path, after_path, out_stem)] for pairs without finished outputs.
+
+    A key found in several --scenes-dir folders is prefixed with its folder name
+    (<dir>_<key>) so each scene gets its own output stem.
+    """
+    pairs = []
+    for d in scenes_dirs:
+        for bf in sorted(glob.glob(os.path.join(d, "*_before*.tif"))):
+            key = os.path.basename(bf).split("_before")[0]
+            afs = sorted(glob.glob(os.path.join(d, f"{key}_after*.tif")))
+            if len(afs) != 1:
+                print(f"[WARN] {bf}: expected one matching _after scene, found {len(afs)}; skipping")
+                continue
+            pairs.append((d, key, bf, afs[0]))
+    counts = {}
+    for _, key, _, _ in pairs:
+        counts[key] = counts.get(key, 0) + 1
+    scenes, done, stems = [], 0, {}
+    for d, key, bf, af in pairs:
+        if counts[key] > 1:
+            key = f"{os.path.basename(os.path.normpath(d))}_{key}"
+        stem = os.path.join(out_dir, key)
+        if stem in stems:
+            raise ValueError(f"{bf} and {stems[stem]} map to the same output {stem}; rename a scenes dir")
+        stems[stem] = bf
+        if all(os.path.exists(stem + OUTPUT_SUFFIX[o]) for o in outputs):
+            done += 1
+            continue
+        scenes.append((key, bf, af, stem))
+    return scenes, done
+
+def part_path(path):
+    root, ext = os.path.splitext(path)
+    return root + ".part" + ext
+
+def scene_windows(width, height, tile):
+    """Full-size windows covering the scene; edge windows are shifted inward (overlapping)."""
+    tw, th = min(tile, width), min(tile, height)
+    cols = list(range(0, width - tw + 1, tw))
+    rows = list(range(0, height - th + 1, th))
+    if cols[-1] + tw < width:
+        cols.append(width - tw)
+    if rows[-1] + th < height:
+        rows.append(height - th)
+    return [Window(c, r, tw, th) for r in rows for c in cols]
+
+class StageStats:
+    def __init__(self, name, threads):
+        self.name, self.threads = name, threads
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, items=1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def report(self, wall):
+        util = self.busy / (wall * self.threads) if wall > 0 else 0.0
+        return {"threads": self.threads, "busy_s": round(self.busy, 3), "items": self.items,
+                "utilization": round(util, 4)}
+
+def pad_to_multiple(arr):
+    ph, pw = (-arr.shape[-2]) % SIZE_MULTIPLE, (-arr.shape[-1]) % SIZE_MULTIPLE
+    if ph or pw:
+        arr = np.pad(arr, ((0, 0), (0, ph), (0, pw)))
+    return arr
+
+def reader(scene_q, batch_q, tile, stats, failed):
+    while True:
+        scene = scene_q.get()
+        if scene is _DONE:
+            batch_q.put(_DONE)
+            return
+        key, bf, af, stem = scene
+        info = {"key": key, "stem": stem}
+        try:
+            with rasterio.open(bf) as bsrc, rasterio.open(af) as asrc:
+                if (bsrc.width, bsrc.height, bsrc.count) != (asrc.width, asrc.height, asrc.count):
+                    raise ValueError("before/after size or band count mismatch")
+                windows = scene_windows(bsrc.width, bsrc.height, tile)
+                profile = bsrc.profile.copy()
+                profile.update(count=1, dtype="float32", nodata=None, compress="deflate", predictor=3,
+                               tiled=True, blockxsize=256, blockysize=256, BIGTIFF="IF_SAFER")
+                info.update(profile=profile, n_windows=len(windows), tile=(windows[0].width, windows[0].height),
+                            transform=bsrc.transform, crs=bsrc.crs)
+                for win in windows:
+                    t0 = time.perf_counter()
+                    b = pad_to_multiple(read_raw(bsrc, window=win))
+                    a = pad_to_multiple(read_raw(asrc, window=win))
+                    stats.add(time.perf_counter() - t0)
+                    batch_q.put((info, win, b, a))
+        except Exception as e:
+            print(f"[ERR] read {key}: {e}")
+            failed[key] = f"read: {e}"
+            batch_q.put((info, None, None, None))  # tell the writer to discard the scene
+
+def owned_region(win, tile):
+    """Offsets inside `win` of the part not already covered by earlier grid windows.
+
+    Only edge windows shifted inward by scene_windows overlap their neighbours.
+    """
+    tw, th = tile
+    col0 = -(-int(win.col_off) // tw) * tw
+    row0 = -(-int(win.row_off) // th) * th
+    return col0 - int(win.col_off), row0 - int(win.row_off)
+
+class SceneOutput:
+    """Per-scene sinks owned by one writer thread: GeoTIFF and/or streamed NDJSON polygons."""
+    def __init__(self, info, outputs, vector_opts):
+        self.info = info
+        self.remaining = info["n_windows"]
+        self.paths = {o: info["stem"] + OUTPUT_SUFFIX[o] for o in outputs}
+        os.makedirs(os.path.dirname(info["stem"]) or ".", exist_ok=True)
+        self.dst = self.vec = self.fh = None
+        if "raster" in outputs:
+            self.dst = rasterio.open(part_path(self.paths["raster"]), "w", **info["profile"])
+        if "polygons" in outputs:
+            self.vec = ChangeVectorizer(info["transform"], info["crs"], width=info["profile"]["width"],
+                                        height=info["profile"]["height"], **vector_opts)
+            self.fh = open(part_path(self.paths["polygons"]), "w")
+
+    def write(self, win, prob):
+        prob = prob[:int(win.height), :int(win.width)]
+        if self.dst is not None:
+            self.dst.write(prob, 1, window=win)
+        if self.vec is not None:
+            dc, dr = owned_region(win, self.info["tile"])
+            feats = self.vec.add_tile(prob[dr:, dc:], int(win.col_off) + dc, int(win.row_off) + dr)
+            self.fh.writelines(iter_ndjson(feats))
+        self.remaining -= 1
+
+    def close(self, commit):
+        if self.vec is not None and commit:
+            self.fh.writelines(iter_ndjson(self.vec.finish()))
+        for sink in (self.dst, self.fh):
+            if sink is not None:
+                sink.close()
+        for path in self.paths.values():
+            part = part_path(path)
+            if commit:
+                os.replace(part, path)
+            elif os.path.exists(part):
+                os.remove(part)
+
+def writer(write_q, stats, failed, completed, outputs, vector_opts):
+    open_scenes = {}  # out stem -> SceneOutput
+    while True:
+        item = write_q.get()
+        if item is _DONE:
+            break
+        info, win, prob = item
+        key, stem = info["key"], info["stem"]
+        t0 = time.perf_counter()
+        try:
+            if win is None or key in failed:
+                if stem in open_scenes:
+                    open_scenes.pop(stem).close(commit=False)
+                continue
+            if stem not in open_scenes:
+                open_scenes[stem] = SceneOutput(info, outputs, vector_opts)
+            out = open_scenes[stem]
+            out.write(win, prob)
+            if out.remaining == 0:
+                open_scenes.pop(stem).close(commit=True)
+                completed.append(key)
+                print(f"[OK] {key} -> {', '.join(out.paths.values())}")
+        except Exception as e:
+            print(f"[ERR] write {key}: {e}")
+            failed[key] = f"write: {e}"
+            if stem in open_scenes:
+                open_scenes.pop(stem).close(commit=False)
+        finally:
+            stats.add(time.perf_counter() - t0)
+    for out in open_scenes.values():
+        out.close(commit=False)
+
+def load_model(model_path, device):
+    return load_siamese_unet(model_path, device).eval()
+
+def run(scenes, model, device, tile=512, batch_size=8, readers=2, writers=2, queue_size=32,
+        outputs=("raster",), vector_opts=None):
+    scene_q = queue.Queue()
+    batch_q = queue.Queue(maxsize=queue_size)
+    write_qs = [queue.Queue(maxsize=queue_size) for _ in range(writers)]
+    stats = {"read": StageStats("read", readers), "compute": StageStats("compute", 1),
+             "write": StageStats("write", writers)}
+    failed, completed = {}, []
+    for s in scenes:
+        scene_q.put(s)
+    for _ in range(readers):
+        scene_q.put(_DONE)
+    threads = [threading.Thread(target=reader, args=(scene_q, batch_q, tile, stats["read"], failed), daemon=True)
+               for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(q, stats["write"], failed, completed, outputs, vector_opts or {}), daemon=True)
+                for q in write_qs]
+    t_start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    def route(info, win, prob):
+        # a scene always goes to the same writer so one thread owns its dataset
+        write_qs[hash(info["stem"]) % writers].put((info, win, prob))
+
+    def next_window(block):
+        """Next real window from the read queue; markers are routed straight to the writer.
+
+        Returns None when no item is available (non-blocking) or a reader finished.
+        """
+        nonlocal live_readers
+        while live_readers:
+            try:
+                item = batch_q.get(block=block)
+            except queue.Empty:
+                return None
+            if item is _DONE:
+                live_readers -= 1
+                if not block:
+                    return None
+                continue
+            if item[1] is None:
+                route(item[0], None, None)
+                continue
+            return item
+        return None
+
+    live_readers = readers
+    pending = None
+    while live_readers or pending is not None:
+        first = pending if pending is not None else next_window(block=True)
+        pending = None
+        if first is None:
+            continue
+        batch = [first]
+        # fill the batch with whatever is ready; never wait on a partial batch
+        while len(batch) < batch_size:
+            item = next_window(block=False)
+            if item is None:
+                break
+            if item[2].shape != first[2].shape:
+                pending = item  # windows of different size go in the next batch
+                break
+            batch.append(item)
+        t0 = time.perf_counter()
+        try:
+            b = torch.from_numpy(np.stack([it[2] for it in batch])).to(device, non_blocking=True)
+            a = torch.from_numpy(np.stack([it[3] for it in batch])).to(device, non_blocking=True)
+            with torch.inference_mode():
+                prob = model(b, a).sigmoid_().squeeze(1).cpu().numpy()
+        except Exception as e:
+            # fail only the scenes in this batch; the writer discards their partial outputs
+            for key, info in {it[0]["key"]: it[0] for it in batch}.items():
+                print(f"[ERR] compute {key}: {e}")
+                failed[key] = f"compute: {e}"
+                route(info, None, None)
+            continue
+        finally:
+            stats["compute"].add(time.perf_counter() - t0, len(batch))
+        for (info, win, _, _), p in zip(batch, prob):
+            route(info, win, p)
+    for q in write_qs:
+        q.put(_DONE)
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t_start
+    report = {"wall_s": round(wall, 3), "scenes_completed": len(completed), "scenes_failed": failed,
+              "stages": {name: st.report(wall) for name, st in stats.items()}}
+    return report
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--scenes-dir", nargs="+", required=True)
+    p.add_argument("--out-dir", required=True)
+    p.add_argument("--model-path", default=os.environ.get("MODEL_PATH", "runs/model_inference.pth"))
+    p.add_argument("--tile", type=int, default=512, help="Inference window size (multiple of 8)")
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--readers", type=int, default=2)
+    p.add_argument("--writers", type=int, default=2)
+    p.add_argument("--queue-size", type=int, default=32, help="Max windows buffered between stages")
+    p.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    p.add_argument("--outputs", nargs="+", choices=sorted(OUTPUT_SUFFIX), default=["raster"],
+                   help="raster: <key>_pred.tif probabilities; polygons: <key>_changes.ndjson (WGS84)")
+    p.add_argument("--threshold", type=float, default=0.5)
+    p.add_argument("--min-area-px", type=int, default=4)
+    p.add_argument("--simplify-px", type=float, default=1.0)
+    p.add_argument("--stats-json", default=None, help="Also write the utilization report here")
+    args = p.parse_args()
+    if args.tile % SIZE_MULTIPLE:
+        raise SystemExit(f"--tile must be a multiple of {SIZE_MULTIPLE}")
+
+    try:
+        scenes, done = find_scenes(args.scenes_dir, args.out_dir, args.outputs)
+    except ValueError as e:
+        raise SystemExit(f"[ERR] {e}")
+    print(f"[INFO] {len(scenes)} scene pairs to process ({done} already done)")
+    if not scenes:
+        return
+    device = torch.device(args.device)
+    model = load_model(args.model_path, device)
+    vector_opts = {"threshold": args.threshold, "min_area_px": args.min_area_px, "simplify_px": args.simplify_px}
+    report = run(scenes, model, device, args.tile, args.batch_size, args.readers, args.writers,
+                 args.queue_size, args.outputs, vector_opts)
+    for name, st in report["stages"].items():
+        print(f"[STATS] {name:8s} threads={st['threads']} busy={st['busy_s']:.1f}s util={st['utilization']*100:.0f}%")
+    print(f"[DONE] {report['scenes_completed']} scenes in {report['wall_s']:.1f}s, {len(report['scenes_failed'])} failed")
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["scenes_failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Turn change-probability tiles into change polygons.
+
+ChangeVectorizer polygonizes the thresholded mask tile by tile in pixel coordinates of the
+full raster. Polygons that do not touch an interior tile edge (edges on the raster border do
+not count) are final and returned immediately; the rest are held back and merged (unary_union)
+with their neighbours. Tiles must arrive in row-major order, so when a new tile row starts,
+held-back groups that do not reach it are complete and are emitted; only polygons touching the
+current row boundary stay in memory. The minimum-area filter and simplification are applied
+to final polygons only, then geometries are mapped through the raster transform and
+reprojected to WGS84 (RFC 7946) when the raster CRS is known.
+"""
+import json
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.features import shapes
+from rasterio.warp import transform_geom
+from affine import Affine
+from shapely.affinity import affine_transform
+from shapely.geometry import shape, mapping
+from shapely.ops import unary_union
+
+WGS84 = CRS.from_epsg(4326)
+
+class ChangeVectorizer:
+    def __init__(self, transform, crs=None, width=None, height=None, threshold=0.5, min_area_px=4,
+                 simplify_px=1.0):
+        """width/height: raster size in pixels. When unknown, right and bottom tile edges are
+        treated as interior, so polygons there are held back until finish()."""
+        self.transform = transform
+        self.width, self.height = width, height
+        self.crs = CRS.from_user_input(crs) if crs else None
+        self.threshold = threshold
+        self.min_area_px = min_area_px
+        self.simplify_px = simplify_px
+        self._edge = []  # pixel-space polygons touching an interior tile edge
+        self._row = 0     # row offset of the tile row being added
+
+    def add_tile(self, prob, col_off=0, row_off=0):
+        """Polygonize one (H, W) probability tile at the given pixel offset.
+
+        Returns the GeoJSON features that are complete once this tile is added.
+        """
+        return list(self._tile_features(prob, col_off, row_off))
+
+    def finish(self):
+        """Stitch the polygons still held back at tile edges and return their features."""
+        return list(self._flush())
+
+    def _tile_features(self, prob, col_off, row_off):
+        if row_off > self._row:
+            # the previous tile row is complete: only groups reaching this row can still grow
+            yield from self._flush(row_off)
+            self._row = row_off
+        mask = np.ascontiguousarray(prob >= self.threshold, dtype=np.uint8)
+        if not mask.any():
+            return
+        h, w = mask.shape
+        right = col_off + w if self.width is None or col_off + w < self.width else None
+        bottom = row_off + h if self.height is None or row_off + h < self.height else None
+        for geom, _ in shapes(mask, mask=mask, connectivity=4,
+                              transform=Affine.translation(col_off, row_off)):
+            poly = shape(geom)
+            minx, miny, maxx, maxy = poly.bounds
+            if ((col_off > 0 and minx <= col_off) or (row_off > 0 and miny <= row_off)
+                    or (right is not None and maxx >= right) or (bottom is not None and maxy >= bottom)):
+                self._edge.append(poly)
+            else:
+                yield from self._features(poly)
+
+    def _flush(self, keep_from=None):
+        """Merge held-back polygons; emit groups ending above row keep_from (all if None)."""
+        if not self._edge:
+            return
+        merged = unary_union(self._edge)
+        self._edge = []
+        for poly in getattr(merged, "geoms", [merged]):
+            if keep_from is not None and poly.bounds[3] >= keep_from:
+                self._edge.append(poly)
+            else:
+                yield from self._features(poly)
+
+    def _features(self, poly):
+        area_px = poly.area
+        if area_px < self.min_area_px:
+            return []
+        if self.simplify_px:
+            poly = poly.simplify(self.simplify_px, preserve_topology=True)
+        t = self.transform
+        geom = affine_transform(poly, [t.a, t.b, t.d, t.e, t.xoff, t.yoff])
+        props = {"area_px": int(round(area_px))}
+        if self.crs is not None and self.crs.is_projected:
+            props["area_m2"] = geom.area * self.crs.linear_units_factor[1] ** 2
+        geom = mapping(geom)
+        if self.crs is not None and self.crs != WGS84:
+            geom = transform_geom(self.crs, WGS84, geom)
+        return [{"type": "Feature", "geometry": geom, "properties": props}]
+
+def polygonize(prob, transform, crs=None, **kwargs):
+    """Yield the change polygons of a single probability array."""
+    h, w = prob.shape
+    vec = ChangeVectorizer(transform, crs, width=w, height=h, **kwargs)
+    yield from vec._tile_features(prob, 0, 0)
+    yield from vec._flush()
+
+def iter_ndjson(features, error_record=False):
+    """One feature per line. With error_record, a failure mid-stream (after the HTTP status
+    was sent) ends the stream with an {"type": "Error"} line instead of truncating it."""
+    try:
+        for feat in features:
+            yield json.dumps(feat) + "\n"
+    except Exception as e:
+        if not error_record:
+            raise
+        print(f"[ERR] polygonize: {e}")
+        yield json.dumps({"type": "Error", "error": str(e)}) + "\n"
+
+def iter_geojson(features, error_record=False):
+    """Stream a FeatureCollection without building the whole document in memory.
+
+    With error_record, a failure mid-stream still closes the document, with an "error" member.
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    try:
+        for i, feat in enumerate(features):
+            yield ("," if i else "") + json.dumps(feat)
+    except Exception as e:
+        if not error_record:
+            raise
+        print(f"[ERR] polygonize: {e}")
+        yield '], "error": ' + json.dumps(str(e)) + "}\n"
+        return
+    yield "]}\n"
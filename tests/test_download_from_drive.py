@@ -0,0 +1,104 @@
+"""
+tools/download_from_drive.py against an in-memory fake Drive (no network, no credentials).
+
+Run: python -m pytest -q tests
+"""
+import hashlib, json, os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+import pytest
+import download_from_drive as dfd
+
+class FakeDrive:
+    """Serves files from a dict {id: bytes}; same fetch_range contract as DriveClient.
+
+    fail_every: every n-th fetch raises (transient API error).
+    short_every: every n-th fetch returns only half of the requested range.
+    fail_after: total fetches before every further fetch raises (an interrupted run).
+    """
+    def __init__(self, blobs, fail_every=0, short_every=0, fail_after=None):
+        self.blobs = blobs
+        self.fail_every, self.short_every, self.fail_after = fail_every, short_every, fail_after
+        self.calls = 0
+        self.bytes_served = 0
+
+    def fetch_range(self, file_id, start, end):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise IOError("connection reset")
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise IOError("503 backend error")
+        data = self.blobs[file_id][start:end + 1]
+        if self.short_every and self.calls % self.short_every == 0 and len(data) > 1:
+            data = data[:len(data) // 2]
+        self.bytes_served += len(data)
+        return data
+
+def meta(file_id, name, blob, modified="2024-01-01T00:00:00.000Z"):
+    return {"id": file_id, "name": name, "size": str(len(blob)),
+            "md5Checksum": hashlib.md5(blob).hexdigest(), "modifiedTime": modified}
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+KW = dict(chunk_size=1000, retries=3, backoff=0.0)
+
+def test_flaky_and_short_responses(tmp_path):
+    blob = os.urandom(10_500)
+    drive = FakeDrive({"a": blob}, fail_every=3, short_every=2)
+    summary = dfd.download_all(drive, [meta("a", "a.tif", blob)], str(tmp_path), workers=1, **KW)
+    assert summary["downloaded"] == 1 and summary["failed"] == []
+    assert read(tmp_path / "a.tif") == blob
+    assert not (tmp_path / "a.tif.part").exists() and not (tmp_path / "a.tif.part.json").exists()
+
+def test_resume_after_interruption(tmp_path):
+    blob = os.urandom(5_000)
+    m = meta("a", "a.tif", blob)
+    with pytest.raises(IOError):
+        dfd.download(FakeDrive({"a": blob}, fail_after=2), m, str(tmp_path), chunk_size=1000, retries=0)
+    assert os.path.getsize(tmp_path / "a.tif.part") == 2_000
+    drive = FakeDrive({"a": blob})
+    assert dfd.download(drive, m, str(tmp_path), **KW) == ("downloaded", 3_000)
+    assert drive.bytes_served == 3_000
+    assert read(tmp_path / "a.tif") == blob
+
+def test_stale_part_from_older_export_is_discarded(tmp_path):
+    old, new = os.urandom(4_000), os.urandom(4_000)
+    with pytest.raises(IOError):
+        dfd.download(FakeDrive({"old": old}, fail_after=2), meta("old", "a.tif", old), str(tmp_path),
+                     chunk_size=1000, retries=0)
+    summary = dfd.download_all(FakeDrive({"new": new}), [meta("new", "a.tif", new, "2024-02-01T00:00:00.000Z")],
+                               str(tmp_path), workers=1, **KW)
+    assert summary["downloaded"] == 1 and summary["bytes"] == 4_000
+    assert read(tmp_path / "a.tif") == new
+
+def test_part_without_sidecar_is_not_trusted(tmp_path):
+    blob = os.urandom(3_000)
+    (tmp_path / "a.tif.part").write_bytes(os.urandom(1_000))
+    assert dfd.download(FakeDrive({"a": blob}), meta("a", "a.tif", blob), str(tmp_path), **KW) == ("downloaded", 3_000)
+    assert read(tmp_path / "a.tif") == blob
+
+def test_corrupt_resume_fails_md5(tmp_path):
+    blob = os.urandom(3_000)
+    m = meta("a", "a.tif", blob)
+    (tmp_path / "a.tif.part").write_bytes(os.urandom(1_000))
+    (tmp_path / "a.tif.part.json").write_text(json.dumps(dfd.part_source(m)))
+    with pytest.raises(IOError, match="md5"):
+        dfd.download(FakeDrive({"a": blob}), m, str(tmp_path), **KW)
+    assert not (tmp_path / "a.tif").exists() and not (tmp_path / "a.tif.part").exists()
+
+def test_existing_file_is_skipped(tmp_path):
+    blob = os.urandom(2_000)
+    (tmp_path / "a.tif").write_bytes(blob)
+    drive = FakeDrive({"a": blob})
+    summary = dfd.download_all(drive, [meta("a", "a.tif", blob)], str(tmp_path), workers=1, verify_md5=True, **KW)
+    assert summary["skipped"] == 1 and drive.calls == 0
+
+def test_duplicate_names_keep_newest(tmp_path):
+    old, new = os.urandom(2_000), os.urandom(3_000)
+    files = [meta("new", "a.tif", new, "2024-02-01T00:00:00.000Z"), meta("old", "a.tif", old, "2024-01-01T00:00:00.000Z")]
+    summary = dfd.download_all(FakeDrive({"old": old, "new": new}), files, str(tmp_path), workers=2, **KW)
+    assert summary["downloaded"] == 1 and summary["failed"] == []
+    assert read(tmp_path / "a.tif") == new
@@ -0,0 +1,141 @@
+"""
+ingest/export_scheduler.run_exports driven by a stub export client (no Earth Engine).
+
+Run: python -m pytest -q tests
+"""
+import asyncio, json, os, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "ingest"))
+import export_scheduler as es
+
+class StubClient:
+    """submit(job) -> task id; status(ids) -> {id: {"state": ...}}.
+
+    submit_errors: {job name: [error message per attempt]}; attempts past the list succeed.
+    polls_to_finish: polls a task reports RUNNING before COMPLETED.
+    states: {job name: fixed state} (None = missing from the status response).
+    status_errors: number of leading status() calls that raise.
+    """
+    def __init__(self, submit_errors=None, polls_to_finish=1, states=None, status_errors=0):
+        self.submit_errors = {k: list(v) for k, v in (submit_errors or {}).items()}
+        self.polls_to_finish = polls_to_finish
+        self.states = states or {}
+        self.status_errors = status_errors
+        self.submits = []  # (job name, monotonic time)
+        self.names = {}    # task id -> job name
+        self.polls = {}
+        self.on_status = None
+
+    def submit(self, job):
+        self.submits.append((job["name"], time.monotonic()))
+        errors = self.submit_errors.get(job["name"])
+        if errors:
+            raise RuntimeError(errors.pop(0))
+        task_id = f"T{len(self.submits)}"
+        self.names[task_id] = job["name"]
+        return task_id
+
+    def status(self, task_ids):
+        if self.on_status:
+            self.on_status(task_ids)
+        if self.status_errors:
+            self.status_errors -= 1
+            raise ConnectionError("getTaskStatus: HTTP 503")
+        out = {}
+        for tid in task_ids:
+            name = self.names.get(tid, tid)
+            if name in self.states:
+                if self.states[name] is not None:
+                    out[tid] = {"id": tid, "state": self.states[name]}
+                continue
+            self.polls[tid] = self.polls.get(tid, 0) + 1
+            state = "COMPLETED" if self.polls[tid] > self.polls_to_finish else "RUNNING"
+            out[tid] = {"id": tid, "state": state}
+        return out
+
+    def submit_times(self, name):
+        return [t for n, t in self.submits if n == name]
+
+def jobs(n):
+    return [{"name": f"job{i}"} for i in range(n)]
+
+def run(client, job_list, manifest_path=None, **kw):
+    opts = dict(max_concurrent=4, poll_interval=0.01, max_retries=2, backoff=0.05, unknown_timeout=0.3)
+    opts.update(kw)
+    return asyncio.run(es.run_exports(client, job_list, manifest_path=manifest_path, log=lambda *a: None, **opts))
+
+def test_all_complete(tmp_path):
+    path = str(tmp_path / "m.json")
+    m = run(StubClient(polls_to_finish=2), jobs(6), path, max_concurrent=2)
+    assert sorted(m["completed"]) == [f"job{i}" for i in range(6)]
+    assert m["failed"] == {} and m["active"] == {}
+    with open(path) as f:
+        assert json.load(f) == m
+
+def test_failed_submit_retries_with_backoff():
+    client = StubClient(submit_errors={"job0": ["backend error", "backend error"]})
+    m = run(client, jobs(2), backoff=0.05)
+    assert "job0" in m["completed"]
+    t = client.submit_times("job0")
+    assert len(t) == 3
+    # delays are backoff * 2^(attempt-1) * (1 + jitter)
+    assert t[1] - t[0] >= 0.05 and t[2] - t[1] >= 0.1
+
+def test_retries_exhausted():
+    client = StubClient(submit_errors={"job0": ["backend error"] * 5})
+    m = run(client, jobs(2), max_retries=1, backoff=0.01)
+    assert m["failed"]["job0"]["attempts"] == 2 and "job1" in m["completed"]
+    assert len(client.submit_times("job0")) == 2
+
+def test_quota_error_pauses_all_submissions():
+    client = StubClient(submit_errors={"job0": ["Quota exceeded: too many concurrent tasks"]})
+    m = run(client, jobs(3), max_concurrent=1, backoff=0.1)
+    assert sorted(m["completed"]) == ["job0", "job1", "job2"]
+    failed_at = client.submit_times("job0")[0]
+    later = [t for n, t in client.submits if t > failed_at]
+    assert later and min(later) - failed_at >= 0.1
+
+def test_active_tasks_are_persisted_and_resumed(tmp_path):
+    path = str(tmp_path / "m.json")
+    seen = []
+    def snapshot(task_ids):
+        with open(path) as f:
+            seen.append(sorted(json.load(f)["active"]))
+    client = StubClient(polls_to_finish=1)
+    client.on_status = snapshot
+    run(client, jobs(2), path)
+    assert seen[0] == ["T1", "T2"]
+
+    # a run interrupted with job0 in flight: the next run polls T9 instead of resubmitting
+    with open(path, "w") as f:
+        json.dump({"completed": {}, "failed": {}, "active": {"T9": {"name": "job0", "task_id": "T9"}}}, f)
+    client = StubClient()
+    m = run(client, jobs(2), path)
+    assert client.submit_times("job0") == []
+    assert m["completed"]["job0"]["task_id"] == "T9"
+    assert "job1" in m["completed"] and m["active"] == {}
+
+def test_stale_active_entries_are_dropped(tmp_path):
+    path = str(tmp_path / "m.json")
+    with open(path, "w") as f:
+        json.dump({"completed": {}, "failed": {}, "active": {"T9": {"name": "other", "task_id": "T9"}}}, f)
+    client = StubClient()
+    m = run(client, jobs(1), path)
+    assert "job0" in m["completed"] and m["active"] == {}
+    assert "T9" not in client.polls
+
+def test_unknown_state_times_out():
+    client = StubClient(states={"job0": None, "job1": "UNKNOWN"})
+    m = run(client, jobs(3), max_retries=0, unknown_timeout=0.05)
+    assert sorted(m["failed"]) == ["job0", "job1"] and "job2" in m["completed"]
+
+def test_terminal_failure_is_retried():
+    client = StubClient(states={"job0": "FAILED"})
+    m = run(client, jobs(1), max_retries=1, backoff=0.01)
+    assert "job0" in m["failed"] and len(client.submit_times("job0")) == 2
+
+def test_status_poll_errors_do_not_abort():
+    client = StubClient(status_errors=3)
+    m = run(client, jobs(2))
+    assert sorted(m["completed"]) == ["job0", "job1"] and m["failed"] == {}
@@ -5,22 +5,30 @@ Download files from Google Drive folder into a local directory.
 Simple script using Google Drive API v3.
 Supports either user OAuth (client_secret.json) or service account key.
 
+Files are fetched by a bounded worker pool in ranged chunks. Partial downloads are kept as
+<name>.part and resumed on the next run, provided <name>.part.json shows they came from the same
+Drive file (id, size, md5, modifiedTime); files already present locally with a matching size
+(and md5, when Drive reports one and --verify-md5 is set) are skipped. Failed chunks are
+retried with exponential backoff.
+
+All Drive access goes through a DriveClient (find_folder / list_files / fetch_range), so the
+engine can be driven by any object with the same methods, e.g. a local fake service.
+
 Example:
 python tools/download_from_drive.py --drive-folder EO_Exports --out-dir data/raw --pattern "india_*_before_*.tif"
 """
-import argparse, os, fnmatch, io
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+import argparse, os, fnmatch, hashlib, json, random, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 TOKEN_FILE = ".drive_token.json"
+CHUNK_SIZE = 1024*1024*8
 
-def get_service_user(client_secret):
+def get_credentials_user(client_secret):
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
     creds = None
     if os.path.exists(TOKEN_FILE):
         creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
@@ -34,46 +42,198 @@ def get_service_user(client_secret):
             creds = flow.run_local_server(port=0)
         with open(TOKEN_FILE, "w") as f:
             f.write(creds.to_json())
-    return build("drive", "v3", credentials=creds, cache_discovery=False)
-
-def get_service_sa(sa_key):
-    creds = service_account.Credentials.from_service_account_file(sa_key, scopes=SCOPES)
-    return build("drive", "v3", credentials=creds, cache_discovery=False)
-
-def find_folder(drive, folder_name):
-    q = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    res = drive.files().list(q=q, spaces="drive", fields="files(id,name)", pageSize=10).execute()
-    files = res.get("files", [])
-    if not files:
-        return None
-    return files[0]["id"]
-
-def list_files(drive, folder_id):
-    files=[]
-    page_token=None
-    q = f"'{folder_id}' in parents and trashed = false"
-    while True:
-        resp = drive.files().list(q=q, spaces="drive", fields="nextPageToken, files(id,name,size)", pageSize=1000, pageToken=page_token).execute()
-        files.extend(resp.get("files",[]))
-        page_token = resp.get("nextPageToken")
-        if not page_token:
-            break
-    return files
-
-def download(drive, file_id, name, out_dir):
-    request = drive.files().get_media(fileId=file_id)
+    return creds
+
+def get_credentials_sa(sa_key):
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_file(sa_key, scopes=SCOPES)
+
+class DriveClient:
+    """Thin wrapper over the Drive v3 API.
+
+    googleapiclient services are not thread-safe, so one service is built per worker thread.
+    """
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._local = threading.local()
+
+    @property
+    def service(self):
+        svc = getattr(self._local, "service", None)
+        if svc is None:
+            from googleapiclient.discovery import build
+            svc = build("drive", "v3", credentials=self.credentials, cache_discovery=False)
+            self._local.service = svc
+        return svc
+
+    def find_folder(self, folder_name):
+        q = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
+        res = self.service.files().list(q=q, spaces="drive", fields="files(id,name)", pageSize=10).execute()
+        files = res.get("files", [])
+        if not files:
+            return None
+        return files[0]["id"]
+
+    def list_files(self, folder_id):
+        files=[]
+        page_token=None
+        q = f"'{folder_id}' in parents and trashed = false"
+        while True:
+            resp = self.service.files().list(q=q, spaces="drive", fields="nextPageToken, files(id,name,size,md5Checksum,modifiedTime)", pageSize=1000, pageToken=page_token).execute()
+            files.extend(resp.get("files",[]))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+        return files
+
+    def fetch_range(self, file_id, start, end):
+        """Return bytes [start, end] (inclusive) of a file's content."""
+        request = self.service.files().get_media(fileId=file_id)
+        request.headers["range"] = f"bytes={start}-{end}"
+        return request.execute()
+
+def md5_file(path, bufsize=CHUNK_SIZE):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(bufsize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def is_present(path, size, md5=None, verify_md5=False):
+    if not os.path.exists(path):
+        return False
+    if size is not None and os.path.getsize(path) != size:
+        return False
+    if verify_md5 and md5:
+        return md5_file(path) == md5
+    return size is not None
+
+def with_retries(fn, retries, backoff, desc):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            print(f"[WARN] {desc}: {e}; retry {attempt+1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+def part_source(meta):
+    """Identity of the Drive file a .part belongs to; a re-export under the same name differs."""
+    return {k: meta.get(k) for k in ("id", "size", "md5Checksum", "modifiedTime")}
+
+def resume_offset(part_path, meta):
+    """Bytes of part_path to keep: 0 unless its sidecar names this exact Drive file."""
+    if not os.path.exists(part_path):
+        return 0
+    try:
+        with open(part_path + ".json") as f:
+            source = json.load(f)
+    except (OSError, ValueError):
+        source = None
+    if source != part_source(meta):
+        print(f"[WARN] {os.path.basename(part_path)}: written by another Drive file; restarting")
+        return 0
+    return os.path.getsize(part_path)
+
+def fetch_chunk(client, file_id, start, end, size):
+    data = client.fetch_range(file_id, start, end)
+    # an empty or oversized answer for a known-size file is an error, so the retry path runs
+    if size is not None and (not data or len(data) > end - start + 1):
+        raise IOError(f"unexpected {len(data)}-byte response for bytes {start}-{end}")
+    return data
+
+def download(client, meta, out_dir, chunk_size=CHUNK_SIZE, retries=5, backoff=1.0,
+             verify_md5=False, progress=None):
+    """Download one Drive file, resuming from <name>.part. Returns (status, bytes_fetched)."""
+    name = meta["name"]
+    size = int(meta["size"]) if meta.get("size") is not None else None
+    md5 = meta.get("md5Checksum")
     out_path = os.path.join(out_dir, name)
+    if is_present(out_path, size, md5, verify_md5):
+        return "skipped", 0
+    part_path = out_path + ".part"
+    offset = resume_offset(part_path, meta)
+    if size is not None and offset > size:
+        offset = 0
+    resumed = offset > 0
+    if not resumed:
+        with open(part_path + ".json", "w") as f:
+            json.dump(part_source(meta), f)
+    fetched = 0
+    with open(part_path, "ab" if offset else "wb") as fh:
+        while size is None or offset < size:
+            start, end = offset, offset + chunk_size - 1
+            if size is not None:
+                end = min(end, size - 1)
+            data = with_retries(lambda: fetch_chunk(client, meta["id"], start, end, size),
+                                retries, backoff, f"{name} bytes {start}-{end}")
+            fh.write(data)
+            offset += len(data); fetched += len(data)
+            if progress is not None:
+                progress.update(len(data))
+            # unknown size: a short chunk marks the end of the file;
+            # known size: a short chunk just means the next range starts earlier
+            if size is None and len(data) < end - start + 1:
+                break
+    if size is not None and offset != size:
+        raise IOError(f"{name}: got {offset} bytes, expected {size}; partial file kept for resume")
+    # a resumed file is always checked: its first bytes come from an earlier run
+    if md5 and (verify_md5 or resumed) and md5_file(part_path) != md5:
+        os.remove(part_path)
+        os.remove(part_path + ".json")
+        raise IOError(f"md5 mismatch for {name}; partial file discarded")
+    os.replace(part_path, out_path)
+    os.remove(part_path + ".json")
+    return "downloaded", fetched
+
+def dedupe_by_name(files):
+    """Keep the newest file of each name.
+
+    Drive allows duplicate names (Earth Engine re-exports create them), and two downloads of
+    the same name would write the same <name>.part concurrently.
+    """
+    newest = {}
+    for f in files:
+        cur = newest.get(f["name"])
+        if cur is None or f.get("modifiedTime", "") >= cur.get("modifiedTime", ""):
+            newest[f["name"]] = f
+    if len(newest) < len(files):
+        for name in sorted(newest):
+            dupes = [f["id"] for f in files if f["name"] == name and f is not newest[name]]
+            if dupes:
+                print(f"[WARN] {name}: {len(dupes)+1} Drive files share this name; keeping newest {newest[name]['id']}")
+    return list(newest.values())
+
+def download_all(client, files, out_dir, workers=4, **kwargs):
+    """Download files concurrently; returns a summary dict with aggregate throughput."""
     os.makedirs(out_dir, exist_ok=True)
-    fh = io.FileIO(out_path, "wb")
-    downloader = MediaIoBaseDownload(fh, request, chunksize=1024*1024*8)
-    done=False
-    with tqdm(unit="chunk", desc=name) as pbar:
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                pbar.update(1)
-    fh.close()
-    return out_path
+    files = dedupe_by_name(files)
+    total = sum(int(f["size"]) for f in files if f.get("size") is not None)
+    summary = {"downloaded": 0, "skipped": 0, "failed": [], "bytes": 0}
+    t0 = time.perf_counter()
+    with tqdm(total=total or None, unit="B", unit_scale=True, desc="drive") as pbar, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(download, client, f, out_dir, progress=pbar, **kwargs): f for f in files}
+        for fut in as_completed(futures):
+            name = futures[fut]["name"]
+            try:
+                status, nbytes = fut.result()
+            except Exception as e:
+                print(f"[ERR] {name}: {e}")
+                summary["failed"].append(name)
+                continue
+            summary[status] += 1
+            summary["bytes"] += nbytes
+            if status == "skipped":
+                size = futures[fut].get("size")
+                if size is not None:
+                    pbar.update(int(size))
+    elapsed = time.perf_counter() - t0
+    summary["seconds"] = elapsed
+    summary["mb_per_s"] = summary["bytes"] / 1e6 / elapsed if elapsed > 0 else 0.0
+    return summary
 
 def main():
     p = argparse.ArgumentParser()
@@ -83,23 +243,32 @@ def main():
     p.add_argument("--drive-folder", default="EO_Exports")
     p.add_argument("--out-dir", required=True)
     p.add_argument("--pattern", default="*.tif")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--chunk-mb", type=int, default=8)
+    p.add_argument("--retries", type=int, default=5)
+    p.add_argument("--verify-md5", action="store_true", help="Check md5 of existing and finished files")
     args = p.parse_args()
 
     if args.service_account_key:
-        drive = get_service_sa(args.service_account_key)
+        client = DriveClient(get_credentials_sa(args.service_account_key))
     else:
-        drive = get_service_user(args.client_secret)
-    folder_id = args.folder_id or find_folder(drive, args.drive_folder)
+        client = DriveClient(get_credentials_user(args.client_secret))
+    folder_id = args.folder_id or client.find_folder(args.drive_folder)
     if not folder_id:
         raise SystemExit("Drive folder not found")
-    files = list_files(drive, folder_id)
+    files = client.list_files(folder_id)
     matches = [f for f in files if fnmatch.fnmatch(f["name"], args.pattern)]
     if not matches:
         print("No matching files.")
         return
-    for f in matches:
-        print("Downloading", f["name"])
-        download(drive, f["id"], f["name"], args.out_dir)
+    print(f"[INFO] {len(matches)} matching files; {args.workers} workers")
+    summary = download_all(client, matches, args.out_dir, workers=args.workers,
+                           chunk_size=args.chunk_mb*1024*1024, retries=args.retries,
+                           verify_md5=args.verify_md5)
+    print(f"[OK] downloaded={summary['downloaded']} skipped={summary['skipped']} failed={len(summary['failed'])} "
+          f"{summary['bytes']/1e6:.1f} MB in {summary['seconds']:.1f}s ({summary['mb_per_s']:.2f} MB/s)")
+    if summary["failed"]:
+        raise SystemExit(1)
     print("Done.")
 
 if __name__ == "__main__":
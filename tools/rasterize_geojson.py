@@ -2,32 +2,123 @@
 """
 Rasterize a GeoJSON polygon (or featurecollection) into a mask aligned with a reference raster.
 
+The mask is produced block by block: features are loaded once into an STRtree and each
+output block only burns the geometries whose bounds intersect it, so peak memory is bounded
+by --block-size (times the number of in-flight blocks) rather than the full scene.
+Blocks are rasterized in a thread pool and written to a tiled, compressed GeoTIFF.
+
+Features are reprojected to the reference raster CRS when they differ. GeoJSON is assumed
+to be WGS84 (RFC 7946) unless it carries a legacy "crs" member or --geojson-crs is given.
+
 Usage:
 python tools/rasterize_geojson.py --before data/raw/..._before.tif --geojson labels/wayanad.geojson --out data/raw/wayanad_mask.tif
 """
 import argparse, json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 import rasterio
+from rasterio.crs import CRS
 from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, bounds as window_bounds, transform as window_transform
+from shapely.geometry import shape, box
+from shapely.strtree import STRtree
+
+DEFAULT_GEOJSON_CRS = "EPSG:4326"
+
+def geojson_crs(gj, override=None):
+    if override:
+        return CRS.from_user_input(override)
+    # legacy (pre RFC 7946) GeoJSON may name its CRS explicitly
+    name = (gj.get("crs") or {}).get("properties", {}).get("name")
+    return CRS.from_user_input(name or DEFAULT_GEOJSON_CRS)
+
+def load_geometries(path, dst_crs, src_crs=None):
+    with open(path) as f:
+        gj = json.load(f)
+    src_crs = geojson_crs(gj, src_crs)
+    reproject = dst_crs is not None and src_crs != dst_crs
+    geoms = []
+    for feat in gj.get("features", [gj]):
+        g = feat.get("geometry")
+        if not g:
+            continue
+        if reproject:
+            g = transform_geom(src_crs, dst_crs, g)
+        geom = shape(g)
+        if not geom.is_empty:
+            geoms.append(geom)
+    return geoms
+
+def iter_windows(width, height, block_size):
+    for row in range(0, height, block_size):
+        for col in range(0, width, block_size):
+            yield Window(col, row, min(block_size, width - col), min(block_size, height - row))
 
-p = argparse.ArgumentParser()
-p.add_argument("--before", required=True)
-p.add_argument("--geojson", required=True)
-p.add_argument("--out", required=True)
-args = p.parse_args()
-
-with rasterio.open(args.before) as src:
-    meta = src.profile.copy()
-    meta.update(count=1, dtype='uint8', nodata=0, compress='lzw')
-    gj = json.load(open(args.geojson))
-    feats = gj.get("features", [gj])
-    geoms = [(f["geometry"], 1) for f in feats]
-    mask = rasterize(
-        geoms,
-        out_shape=(src.height, src.width),
-        transform=src.transform,
+def rasterize_block(tree, geoms, win, transform, all_touched=False):
+    shape_hw = (int(win.height), int(win.width))
+    hits = tree.query(box(*window_bounds(win, transform)))
+    if len(hits) == 0:
+        return np.zeros(shape_hw, dtype='uint8')
+    return rasterize(
+        ((geoms[i], 1) for i in hits),
+        out_shape=shape_hw,
+        transform=window_transform(win, transform),
         fill=0,
+        all_touched=all_touched,
         dtype='uint8'
     )
-    with rasterio.open(args.out, "w", **meta) as dst:
-        dst.write(mask, 1)
-print("[OK] wrote", args.out)
+
+def rasterize_to_file(ref_path, geojson_path, out_path, block_size=1024, workers=4,
+                      geojson_crs_override=None, all_touched=False):
+    if block_size % 16:
+        raise ValueError("--block-size must be a multiple of 16 (GeoTIFF tile constraint)")
+    with rasterio.open(ref_path) as src:
+        meta = src.profile.copy()
+        transform, width, height, crs = src.transform, src.width, src.height, src.crs
+    meta.update(count=1, dtype='uint8', nodata=0, compress='lzw',
+                tiled=True, blockxsize=block_size, blockysize=block_size)
+
+    geoms = load_geometries(geojson_path, crs, geojson_crs_override)
+    tree = STRtree(geoms)
+    print(f"[INFO] indexed {len(geoms)} features; raster {width}x{height}, block {block_size}")
+
+    windows = iter_windows(width, height, block_size)
+    max_inflight = max(1, workers) * 2
+    n = 0
+    # GDAL datasets are not thread-safe: workers only rasterize, this thread does all writes
+    with rasterio.open(out_path, "w", **meta) as dst, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        def submit_next():
+            win = next(windows, None)
+            if win is None:
+                return False
+            pending[pool.submit(rasterize_block, tree, geoms, win, transform, all_touched)] = win
+            return True
+        while len(pending) < max_inflight and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                win = pending.pop(fut)
+                dst.write(fut.result(), 1, window=win)
+                n += 1
+                submit_next()
+    return n
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--before", required=True, help="Reference raster defining grid, transform and CRS")
+    p.add_argument("--geojson", required=True)
+    p.add_argument("--out", required=True)
+    p.add_argument("--block-size", type=int, default=1024)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--geojson-crs", default=None, help="Override the CRS of the GeoJSON features")
+    p.add_argument("--all-touched", action="store_true")
+    args = p.parse_args()
+    n = rasterize_to_file(args.before, args.geojson, args.out, args.block_size, args.workers,
+                          args.geojson_crs, args.all_touched)
+    print("[OK] wrote", args.out, f"({n} blocks)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# train package initializer
+# keep package import side-effect free
@@ -1,10 +1,13 @@
 
-import argparse, glob, os
+import argparse, glob, inspect, os, sys, time
 import torch
-import rasterio
 import numpy as np
 import mlflow
-from train.model.siamese_unet import SiameseUNet
+import mlflow.pytorch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train.model.siamese_unet import load_siamese_unet
+from train.raster_io import BufferPool
 
 
 def iou_score(pred, target, thr=0.5):
@@ -16,39 +19,80 @@ def iou_score(pred, target, thr=0.5):
 
 
 def evaluate(model_path, data_dir):
+    """Mean IoU plus speed of a checkpoint (any SiameseUNet width) over up to 50 chips."""
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = SiameseUNet(in_ch=6).to(device)
-    state = torch.load(model_path, map_location=device)
-    model.load_state_dict(state)
+    model = load_siamese_unet(model_path, device)
     model.eval()
     files = sorted(glob.glob(os.path.join(data_dir, '*_before.tif')))
     scores = []
+    forward_s = 0.0
+    buffers = BufferPool()
+    if files:
+        # untimed warmup: first-call allocation and kernel selection would inflate ms_per_chip
+        with torch.no_grad():
+            af = files[0].replace('_before.tif','_after.tif')
+            model(torch.from_numpy(buffers.read_raw(files[0], name='before')).unsqueeze(0).to(device),
+                  torch.from_numpy(buffers.read_raw(af, name='after')).unsqueeze(0).to(device))
     for bf in files[:50]:
         af = bf.replace('_before.tif','_after.tif')
         mf = bf.replace('_before.tif','_mask.tif')
-        with rasterio.open(bf) as ds:
-            b = ds.read().astype('float32')/10000.0
-        with rasterio.open(af) as ds:
-            a = ds.read().astype('float32')/10000.0
-        with rasterio.open(mf) as ds:
-            m = ds.read(1).astype('float32')
+        b = buffers.read_raw(bf, name='before')
+        a = buffers.read_raw(af, name='after')
+        m = buffers.read_mask(mf)
         bi = torch.from_numpy(b).unsqueeze(0).to(device)
         ai = torch.from_numpy(a).unsqueeze(0).to(device)
+        t0 = time.perf_counter()
         with torch.no_grad():
-            out = model(bi, ai).squeeze(0).squeeze(0).cpu().numpy()
-        scores.append(iou_score(out, m))
-    return float(np.mean(scores)), len(scores)
+            out = model(bi, ai)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+        forward_s += time.perf_counter() - t0
+        scores.append(iou_score(out.squeeze(0).squeeze(0).cpu().numpy(), m))
+    return {
+        'mean_iou': float(np.mean(scores)),
+        'n': len(scores),
+        'ms_per_chip': 1000.0 * forward_s / max(1, len(scores)),
+        'params': sum(p.numel() for p in model.parameters()),
+        'base': model.base,
+    }
+
+def report(results):
+    names = list(results)
+    print(f"{'model':10s} {'base':>5s} {'params':>10s} {'mean_iou':>9s} {'ms/chip':>9s}")
+    for name in names:
+        r = results[name]
+        print(f"{name:10s} {r['base']:5d} {r['params']:10d} {r['mean_iou']:9.4f} {r['ms_per_chip']:9.2f}")
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--model-path', required=True)
     p.add_argument('--data-dir', default='data/chips')
+    p.add_argument('--teacher-path', default=None, help='Evaluate a teacher alongside a distilled model')
+    p.add_argument('--register-name', default=None, help='Register the evaluated model in the MLflow registry')
     args = p.parse_args()
     mlflow.set_experiment('eval')
     with mlflow.start_run():
-        mean_iou, n = evaluate(args.model_path, args.data_dir)
-        mlflow.log_metric('mean_iou', mean_iou)
-        print(f'[OK] evaluated {n} samples; mean_iou={mean_iou:.4f}')
+        res = evaluate(args.model_path, args.data_dir)
+        mlflow.log_params({'model_path': args.model_path, 'base': res['base'], 'params': res['params']})
+        mlflow.log_metric('mean_iou', res['mean_iou'])
+        mlflow.log_metric('ms_per_chip', res['ms_per_chip'])
+        print(f"[OK] evaluated {res['n']} samples; mean_iou={res['mean_iou']:.4f} ms_per_chip={res['ms_per_chip']:.2f}")
+        if args.teacher_path:
+            teacher = evaluate(args.teacher_path, args.data_dir)
+            mlflow.log_params({'teacher_path': args.teacher_path, 'teacher_base': teacher['base']})
+            mlflow.log_metric('teacher_mean_iou', teacher['mean_iou'])
+            mlflow.log_metric('teacher_ms_per_chip', teacher['ms_per_chip'])
+            mlflow.log_metric('iou_delta', res['mean_iou'] - teacher['mean_iou'])
+            mlflow.log_metric('speedup', teacher['ms_per_chip'] / res['ms_per_chip'] if res['ms_per_chip'] else 0.0)
+            report({'teacher': teacher, 'student': res})
+        if args.register_name:
+            model = load_siamese_unet(args.model_path).eval()
+            kwargs = {}
+            # MLflow 3 defaults to a traced pt2 export, which needs a single-tensor signature
+            if 'serialization_format' in inspect.signature(mlflow.pytorch.log_model).parameters:
+                kwargs['serialization_format'] = 'pickle'
+            mlflow.pytorch.log_model(model, 'model', registered_model_name=args.register_name, **kwargs)
+            print(f'[OK] registered {args.model_path} as {args.register_name}')
 
 if __name__=='__main__':
     main()
@@ -1,6 +1,7 @@
 """
 Siamese U-Net for change detection (fixed decoder depth).
-Input: before/after chips (B, C, H, W)
+Input: raw before/after chips (B, C, H, W) as uint16 digital numbers (any dtype accepted);
+reflectance scaling and per-band normalization happen in the fused InputNorm op.
 This variant uses 3 downsampling (enc2/enc3/enc4) and 3 upsampling steps,
 so the final output spatial size matches the input.
 """
@@ -8,6 +9,40 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+REFLECTANCE_SCALE = 10000.0
+
+class InputNorm(nn.Module):
+    """Fused input op: raw DN -> (x / scale - mean) / std per band, as one multiply-add.
+
+    weight = 1 / (scale * std), bias = -mean / std. With the default stats (mean 0, std 1)
+    this is plain reflectance scaling, i.e. the former `ds.read() / 10000.0` on the host.
+    Stats live in buffers, so they travel with the checkpoint.
+    """
+    def __init__(self, in_ch, scale=REFLECTANCE_SCALE, mean=None, std=None):
+        super().__init__()
+        self.register_buffer("weight", torch.empty(in_ch))
+        self.register_buffer("bias", torch.empty(in_ch))
+        self.set_stats(scale, mean, std)
+
+    @torch.no_grad()
+    def set_stats(self, scale=REFLECTANCE_SCALE, mean=None, std=None):
+        """mean/std are per-band reflectance statistics (e.g. baseline.json band_mean/band_std)."""
+        n = self.weight.numel()
+        mean = torch.zeros(n, dtype=torch.float64) if mean is None else torch.as_tensor(mean, dtype=torch.float64)
+        std = torch.ones(n, dtype=torch.float64) if std is None else torch.as_tensor(std, dtype=torch.float64)
+        self.weight.copy_(1.0 / (scale * std))
+        self.bias.copy_(-mean / std)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # checkpoints saved before the fused input op carry no stats: keep plain scaling
+        for name in ("weight", "bias"):
+            state_dict.setdefault(prefix + name, getattr(self, name))
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+    def forward(self, x):
+        x = x.to(self.weight.dtype)
+        return torch.addcmul(self.bias.view(1, -1, 1, 1), x, self.weight.view(1, -1, 1, 1))
+
 class ConvBlock(nn.Module):
     def __init__(self, in_ch, out_ch):
         super().__init__()
@@ -49,6 +84,8 @@ class Up(nn.Module):
 class SiameseUNet(nn.Module):
     def __init__(self, in_ch=6, base=32):
         super().__init__()
+        self.base = base
+        self.input_norm = InputNorm(in_ch)
         # encoder (apply to before and after separately)
         self.enc1 = ConvBlock(in_ch, base)         # spatial: H
         self.enc2 = Down(base, base*2)             # spatial: H/2
@@ -70,13 +107,18 @@ class SiameseUNet(nn.Module):
         self.final = nn.Conv2d(base*2, 1, kernel_size=1)
 
     def encode_single(self, x):
+        x = self.input_norm(x)
         e1 = self.enc1(x)   # base channels, H
         e2 = self.enc2(e1)  # base*2 channels, H/2
         e3 = self.enc3(e2)  # base*4 channels, H/4
         e4 = self.enc4(e3)  # base*8 channels, H/8
         return e1, e2, e3, e4
 
-    def forward(self, before, after):
+    def pyramid_channels(self):
+        """Channels of the concatenated encoder pyramid (c1..c4) returned with return_features."""
+        return [self.base*2, self.base*2*2, self.base*4*2, self.base*8*2]
+
+    def forward(self, before, after, return_features=False):
         # before/after: (B, C, H, W)
         b1,b2,b3,b4 = self.encode_single(before)
         a1,a2,a3,a4 = self.encode_single(after)
@@ -94,4 +136,17 @@ class SiameseUNet(nn.Module):
         x = self.up1(x, c1)              # H
 
         out = self.final(x)              # (B,1,H,W)
+        if return_features:
+            return out, [c1, c2, c3, c4]
         return out
+
+def base_from_state_dict(state):
+    """Width (`base`) of the SiameseUNet a state dict was saved from."""
+    return state["enc1.conv.0.weight"].shape[0]
+
+def load_siamese_unet(path, device="cpu", in_ch=6):
+    """Build a SiameseUNet of the checkpoint's width (teacher or distilled student) and load it."""
+    state = torch.load(path, map_location=device)
+    model = SiameseUNet(in_ch=in_ch, base=base_from_state_dict(state)).to(device)
+    model.load_state_dict(state)
+    return model
@@ -0,0 +1,83 @@
+"""
+Shared raster reading for chips and scenes.
+
+Bands are read as raw uint16 digital numbers directly into caller-owned or pooled buffers
+(GDAL converts on read, so there is no intermediate float copy). Reflectance scaling and
+per-band normalization are applied inside the model by siamese_unet.InputNorm.
+"""
+import threading
+import numpy as np
+import rasterio
+
+RAW_DTYPE = np.uint16
+MASK_DTYPE = np.uint8
+# Sentinel-2 L2A digital numbers -> surface reflectance
+REFLECTANCE_SCALE = 10000.0
+
+def _read(src, indexes, out, window, dtype):
+    if isinstance(src, (str, bytes)) or hasattr(src, "__fspath__"):
+        with rasterio.open(src) as ds:
+            return _read(ds, indexes, out, window, dtype)
+    count = 1 if isinstance(indexes, int) else (len(indexes) if indexes else src.count)
+    h, w = (int(window.height), int(window.width)) if window is not None else (src.height, src.width)
+    shape = (h, w) if isinstance(indexes, int) else (count, h, w)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape or out.dtype != dtype:
+        raise ValueError(f"buffer {out.shape}/{out.dtype} does not fit read of {shape}/{np.dtype(dtype)}")
+    return src.read(indexes, out=out, window=window, out_dtype=dtype)
+
+def read_raw(src, out=None, window=None, indexes=None):
+    """Read bands of a path or open dataset as uint16 (C, H, W), into `out` if given."""
+    return _read(src, indexes, out, window, RAW_DTYPE)
+
+def read_mask(src, out=None, window=None):
+    """Read band 1 of a path or open dataset as uint8 (H, W), into `out` if given."""
+    return _read(src, 1, out, window, MASK_DTYPE)
+
+def raster_shape(src, window=None, indexes=None):
+    if isinstance(src, (str, bytes)) or hasattr(src, "__fspath__"):
+        with rasterio.open(src) as ds:
+            return raster_shape(ds, window, indexes)
+    count = len(indexes) if indexes else src.count
+    if window is not None:
+        return (count, int(window.height), int(window.width))
+    return (count, src.height, src.width)
+
+class BufferPool:
+    """Per-thread reusable read buffers, one per name.
+
+    A buffer handed out by get() is overwritten by the next get() with the same name on the
+    same thread, so callers must finish with (or copy) the data before reading again. A request
+    for a different shape or dtype replaces the buffer, so a pool holds at most one buffer per
+    name however many raster sizes it sees.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, shape, dtype=RAW_DTYPE, name=""):
+        bufs = self._local.__dict__.setdefault("bufs", {})
+        buf = bufs.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != np.dtype(dtype):
+            buf = bufs[name] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def read_raw(self, src, name="", window=None, indexes=None):
+        if isinstance(src, (str, bytes)) or hasattr(src, "__fspath__"):
+            with rasterio.open(src) as ds:
+                return self.read_raw(ds, name, window, indexes)
+        return read_raw(src, self.get(raster_shape(src, window, indexes), RAW_DTYPE, name), window, indexes)
+
+    def read_mask(self, src, name="mask", window=None):
+        if isinstance(src, (str, bytes)) or hasattr(src, "__fspath__"):
+            with rasterio.open(src) as ds:
+                return self.read_mask(ds, name, window)
+        shape = raster_shape(src, window)[1:]
+        return read_mask(src, self.get(shape, MASK_DTYPE, name), window)
+
+def band_stats(arr):
+    """Per-band (mean, std) of a raw (C, H, W) array, in reflectance units."""
+    flat = arr.reshape(arr.shape[0], -1)
+    mean = flat.mean(axis=1, dtype=np.float64) / REFLECTANCE_SCALE
+    std = flat.std(axis=1, dtype=np.float64) / REFLECTANCE_SCALE
+    return mean, std
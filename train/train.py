@@ -1,12 +1,18 @@
-import argparse, glob, os
+import argparse, glob, json, os, sys
 import torch, torch.nn as nn, torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
-import rasterio
-import numpy as np
 import mlflow
-from model.siamese_unet import SiameseUNet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train.model.siamese_unet import SiameseUNet, load_siamese_unet
+from train.raster_io import read_raw, read_mask
 
 class ChipDataset(Dataset):
+    """Yields raw (uint16 before, uint16 after, uint8 mask[1,H,W]) tensors.
+
+    Each sample gets fresh arrays (the default collate stacks samples after the whole batch
+    is fetched, so per-sample buffers cannot be reused here); scaling happens in the model.
+    """
     def __init__(self, folder):
         self.before = sorted(glob.glob(os.path.join(folder, "*_before.tif")))
     def __len__(self): return len(self.before)
@@ -14,33 +20,88 @@ class ChipDataset(Dataset):
         bfile = self.before[idx]
         afile = bfile.replace("_before.tif", "_after.tif")
         mfile = bfile.replace("_before.tif", "_mask.tif")
-        with rasterio.open(bfile) as ds:
-            b = ds.read().astype('float32')/10000.0
-        with rasterio.open(afile) as ds:
-            a = ds.read().astype('float32')/10000.0
-        with rasterio.open(mfile) as ds:
-            m = ds.read(1).astype('float32')
+        b = read_raw(bfile)
+        a = read_raw(afile)
+        m = read_mask(mfile)
         return torch.from_numpy(b), torch.from_numpy(a), torch.from_numpy(m).unsqueeze(0)
 
+class Distiller(nn.Module):
+    """Distillation loss for a student SiameseUNet supervised by a frozen teacher.
+
+    loss = alpha * BCE(student, mask)
+         + (1 - alpha) * T^2 * BCE(student / T, sigmoid(teacher / T))   (soft targets)
+         + feature_weight * mean_l MSE(adapter_l(student c_l), teacher c_l)
+    The 1x1 adapters map student pyramid channels to the teacher's; they are trained with the
+    student and discarded afterwards.
+    """
+    def __init__(self, teacher, student, alpha=0.5, temperature=2.0, feature_weight=0.0):
+        super().__init__()
+        self.teacher = teacher.eval().requires_grad_(False)
+        self.alpha, self.temperature, self.feature_weight = alpha, temperature, feature_weight
+        self.adapters = nn.ModuleList(
+            nn.Conv2d(s, t, kernel_size=1)
+            for s, t in zip(student.pyramid_channels(), teacher.pyramid_channels())
+        ) if feature_weight > 0 else None
+        self.bce = nn.BCEWithLogitsLoss()
+
+    def forward(self, student_out, student_feats, b, a, m):
+        with torch.no_grad():
+            t_out, t_feats = self.teacher(b, a, return_features=True)
+        T = self.temperature
+        loss = self.alpha * self.bce(student_out, m)
+        loss = loss + (1 - self.alpha) * T * T * self.bce(student_out / T, torch.sigmoid(t_out / T))
+        if self.adapters is not None:
+            feat = sum(nn.functional.mse_loss(ad(sf), tf) for ad, sf, tf in zip(self.adapters, student_feats, t_feats))
+            loss = loss + self.feature_weight * feat / len(t_feats)
+        return loss
+
 def train_loop(args):
     ds = ChipDataset(args.data_dir)
     print(f"DEBUG: dataset length = {len(ds)}")
-    dl = DataLoader(ds, batch_size=args.batch_size, shuffle=True, num_workers=0)
     device = torch.device("cuda" if torch.cuda.is_available() else ("mps" if getattr(torch, "has_mps", False) and torch.has_mps else "cpu"))
+    dl = DataLoader(ds, batch_size=args.batch_size, shuffle=True, num_workers=args.num_workers,
+                    pin_memory=device.type == "cuda", persistent_workers=args.num_workers > 0)
     print("Using device:", device)
-    model = SiameseUNet(in_ch=6).to(device)
-    opt = optim.Adam(model.parameters(), lr=args.lr)
+    distiller = None
+    if args.teacher:
+        teacher = load_siamese_unet(args.teacher, device)
+        model = SiameseUNet(in_ch=6, base=args.student_base).to(device)
+        # the student sees inputs exactly as the teacher was trained on them
+        model.input_norm.load_state_dict(teacher.input_norm.state_dict())
+        distiller = Distiller(teacher, model, args.kd_alpha, args.kd_temperature, args.feature_weight).to(device)
+        print(f"Distilling {args.teacher} (base={teacher.base}) into student base={args.student_base}")
+    else:
+        model = SiameseUNet(in_ch=6).to(device)
+    if args.baseline:
+        with open(args.baseline) as f:
+            stats = json.load(f)
+        # per-band normalization is folded into the model's fused input op
+        model.input_norm.set_stats(mean=stats["band_mean"], std=stats["band_std"])
+        print("Normalizing inputs with", args.baseline)
+    params = list(model.parameters())
+    if distiller is not None:
+        params += [q for q in distiller.parameters() if q.requires_grad]  # adapters; the teacher is frozen
+    opt = optim.Adam(params, lr=args.lr)
     bce = nn.BCEWithLogitsLoss()
     mlflow.set_experiment(args.experiment)
     with mlflow.start_run():
-        mlflow.log_params({"epochs": args.epochs, "batch_size": args.batch_size, "lr": args.lr})
+        mlflow.log_params({"epochs": args.epochs, "batch_size": args.batch_size, "lr": args.lr,
+                           "baseline_norm": bool(args.baseline), "base": model.base})
+        if distiller is not None:
+            mlflow.log_params({"teacher": args.teacher, "kd_alpha": args.kd_alpha,
+                               "kd_temperature": args.kd_temperature, "feature_weight": args.feature_weight})
         for ep in range(args.epochs):
             model.train()
             epoch_loss = 0.0
             for i, (b,a,m) in enumerate(dl):
-                b = b.to(device); a = a.to(device); m = m.to(device)
-                out = model(b, a)
-                loss = bce(out, m)
+                b = b.to(device, non_blocking=True); a = a.to(device, non_blocking=True)
+                m = m.to(device, non_blocking=True).float()
+                if distiller is not None:
+                    out, feats = model(b, a, return_features=True)
+                    loss = distiller(out, feats, b, a, m)
+                else:
+                    out = model(b, a)
+                    loss = bce(out, m)
                 opt.zero_grad(); loss.backward(); opt.step()
                 epoch_loss += loss.item()
                 if i % 10 == 0:
@@ -49,8 +110,8 @@ def train_loop(args):
             print(f"Epoch {ep} loss {avg:.4f}")
             mlflow.log_metric("train_loss", avg, step=ep)
         # save model
-        os.makedirs("runs", exist_ok=True)
-        model_path = "runs/model_inference.pth"
+        model_path = args.model_out or ("runs/model_student.pth" if distiller is not None else "runs/model_inference.pth")
+        os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
         torch.save(model.state_dict(), model_path)
         mlflow.log_artifact(model_path)
         print("[OK] model saved to", model_path)
@@ -62,5 +123,16 @@ if __name__ == "__main__":
     p.add_argument("--batch-size", type=int, default=2)
     p.add_argument("--lr", type=float, default=3e-4)
     p.add_argument("--experiment", default="deforestation_demo")
+    p.add_argument("--num-workers", type=int, default=0)
+    p.add_argument("--baseline", default=None, help="baseline.json; folds per-band normalization into the model")
+    p.add_argument("--model-out", default=None, help="default runs/model_inference.pth (runs/model_student.pth when distilling)")
+    p.add_argument("--teacher", default=None, help="Trained teacher checkpoint; enables distillation into a student")
+    p.add_argument("--student-base", type=int, default=8, help="Student width (teacher default is 32)")
+    p.add_argument("--kd-alpha", type=float, default=0.5, help="Weight of the hard-label loss vs soft targets")
+    p.add_argument("--kd-temperature", type=float, default=2.0)
+    p.add_argument("--feature-weight", type=float, default=0.0, help="Encoder pyramid feature matching; 0 disables")
     args = p.parse_args()
+    if args.teacher and args.baseline:
+        # the student copies the teacher's input normalization; a baseline would overwrite it
+        p.error("--baseline cannot be combined with --teacher (the student inherits the teacher's normalization)")
     train_loop(args)
\ No newline at end of file